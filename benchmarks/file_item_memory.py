@@ -0,0 +1,135 @@
+"""
+Memory benchmark for FileItem.
+
+Compares the memory used by N FileItems (1M by default) against the previous FileItem, which held a
+QFileInfo, a __dict__ and all derived strings from __init__. Each variant runs in its own process so the
+resident set size is not polluted by the other one.
+
+Usage:
+    python -m benchmarks.file_item_memory
+    python -m benchmarks.file_item_memory --count 100000
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# libs.consts reads these on import, they are only set on Windows.
+os.environ.setdefault('APPDATA', tempfile.gettempdir())
+os.environ.setdefault('USERPROFILE', os.path.expanduser('~'))
+
+from PySide2 import QtCore
+
+from libs.consts import FULL_PATH
+
+
+class LegacyFileItem:
+    """
+    FileItem as it was before it was slotted, kept here as the baseline.
+    """
+
+    _file_info = QtCore.QFileInfo()
+    _full_path = None
+    _icon = None
+    _nice_name = ""
+    _clicked_times = 0
+    _sort_token = ""
+
+    def __init__(self, item_data: dict):
+        self._color = [1.0, 1.0, 1.0, 1.0]
+
+        self.__dict__.update(item_data)
+        self._file_info = QtCore.QFileInfo(self._full_path)
+        self._file_name = self._file_info.fileName()
+        self._suffix = self._file_info.completeSuffix()
+
+        if self._file_info.isDir():
+            self._suffix = "0"
+
+        if not self._sort_token:
+            self._sort_token = self._suffix + self._file_name
+
+
+def rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def make_paths(count: int):
+    root = "C:/Projects/assets"
+    return ["{}/dir_{:04d}/file_{:07d}.{}".format(root, i // 1000, i, ("png", "py", "tar.gz")[i % 3])
+            for i in range(count)]
+
+
+def measure(variant: str, count: int):
+    if variant == "legacy":
+        item_class = LegacyFileItem
+    else:
+        from libs.widgets import FileItem
+        item_class = FileItem
+
+    paths = make_paths(count)
+    gc.collect()
+
+    rss_before = rss_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    items = [item_class({FULL_PATH: p}) for p in paths]
+
+    elapsed = time.perf_counter() - start
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss_bytes()
+
+    return {"variant": variant,
+            "count": len(items),
+            "seconds": round(elapsed, 3),
+            "python_heap_bytes": traced,
+            "rss_delta_bytes": rss_after - rss_before,
+            "bytes_per_item": round(max(traced, rss_after - rss_before) / max(1, count), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--variant", choices=["legacy", "current"], help="Run a single variant in this process.")
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.count)))
+        return
+
+    results = []
+    for variant in ("legacy", "current"):
+        output = subprocess.check_output([sys.executable, "-m", "benchmarks.file_item_memory",
+                                          "--variant", variant, "--count", str(args.count)],
+                                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+    for r in results:
+        print("{variant:>8}: {count} items, {seconds}s, python heap {python_heap_bytes:,} B, "
+              "rss +{rss_delta_bytes:,} B, ~{bytes_per_item} B/item".format(**r))
+
+    legacy, current = results
+    if current["bytes_per_item"]:
+        print("FileItem uses {:.1f}x less memory".format(legacy["bytes_per_item"] / current["bytes_per_item"]))
+
+
+if __name__ == '__main__':
+    main()
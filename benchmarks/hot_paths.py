@@ -0,0 +1,387 @@
+"""
+Headless benchmarks of the hot paths over synthetic directory trees.
+
+Runs every benchmark for every tree size in its own process, so each gets its own peak RSS, and writes
+wall time and peak RSS of each to a JSON file that can be compared between runs. Qt runs on the offscreen
+platform, no display is needed.
+
+Trees are made once under --tree-dir and reused by later runs. Each size gets a nested tree of
+--depth levels of --fan-out folders with the files spread over all folders, and a flat folder holding
+the same number of files for the listing benchmarks.
+
+Usage:
+    python -m benchmarks.hot_paths
+    python -m benchmarks.hot_paths --sizes 10000 100000 --output before.json
+    python -m benchmarks.hot_paths --benchmarks search_substring search_fuzzy --sizes 1000000
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# Before Qt and libs.consts are imported. Settings and data go to a temp folder, not the user's.
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+BENCHMARK_HOME = os.path.join(tempfile.gettempdir(), "file-browser-bench-home")
+os.environ['APPDATA'] = BENCHMARK_HOME
+os.environ.setdefault('USERPROFILE', BENCHMARK_HOME)
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DEFAULT_DEPTH = 3
+DEFAULT_FAN_OUT = 10
+DEFAULT_TREE_DIR = os.path.join(tempfile.gettempdir(), "file-browser-bench-trees")
+LISTING_TIMEOUT = 600  # Seconds
+
+SUFFIXES = ("py", "png", "txt", "tar.gz", "ma", "json")
+
+
+# Synthetic Trees
+# ========================================
+def tree_path(tree_dir: str, size: int, depth: int, fan_out: int):
+    return os.path.join(tree_dir, "tree_{}_d{}_f{}".format(size, depth, fan_out))
+
+
+def flat_path(tree_dir: str, size: int):
+    return os.path.join(tree_dir, "flat_{}".format(size))
+
+
+def make_files(directory: str, start: int, count: int):
+    for i in range(start, start + count):
+        name = "file_{:07d}.{}".format(i, SUFFIXES[i % len(SUFFIXES)])
+        open(os.path.join(directory, name), 'w').close()
+
+
+def generate_tree(root: str, size: int, depth: int, fan_out: int):
+    """
+    Make a tree of size entries, folders included, unless it was made before.
+    :return: root
+    """
+    done_marker = os.path.join(root, ".complete")
+    if os.path.exists(done_marker):
+        return root
+
+    os.makedirs(root, exist_ok=True)
+    folders = [root]
+    level = [root]
+    for d in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(fan_out):
+                if len(folders) - 1 >= size:
+                    break
+                path = os.path.join(parent, "dir_{}_{:03d}".format(d, i))
+                os.makedirs(path, exist_ok=True)
+                next_level.append(path)
+                folders.append(path)
+        level = next_level
+
+    files = max(0, size - (len(folders) - 1))
+    per_folder, extra = divmod(files, len(folders))
+    start = 0
+    for num, folder in enumerate(folders):
+        count = per_folder + (1 if num < extra else 0)
+        make_files(folder, start, count)
+        start += count
+
+    open(done_marker, 'w').close()
+    return root
+
+
+def generate_flat(root: str, size: int):
+    return generate_tree(root, size, 0, 0)
+
+
+# Measuring
+# ========================================
+def peak_rss_bytes():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        return getattr(psutil.Process().memory_info(), "peak_wset", 0)
+    except ImportError:
+        return 0
+
+
+class Timer:
+    """
+    Wall time of the with block, benchmarks only time the part they are named after.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __enter__(self):
+        gc.collect()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.seconds += time.perf_counter() - self._start
+
+
+def qt_app():
+    from PySide2 import QtWidgets
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+
+
+def make_items(root: str):
+    """
+    :return: [FileItem] of every entry below root, folders know they are folders.
+    """
+    from libs.consts import FULL_PATH
+    from libs.widgets import FileItem
+
+    items = []
+    for directory, dirs, files in os.walk(root):
+        directory = directory.replace('\\', '/')
+        items.extend(FileItem({FULL_PATH: directory + "/" + d}, True) for d in dirs)
+        items.extend(FileItem({FULL_PATH: directory + "/" + f}, False) for f in files if f != ".complete")
+    return items
+
+
+def wait_for_listing(view, timer: Timer):
+    from PySide2 import QtCore
+
+    loop = QtCore.QEventLoop()
+    view.directory_loaded.connect(lambda *args: loop.quit())
+    QtCore.QTimer.singleShot(LISTING_TIMEOUT * 1000, loop.quit)
+    with timer:
+        view.set_root_directory(view.benchmark_root)
+        if view.is_listing():
+            loop.exec_()
+
+
+# Benchmarks
+# ========================================
+def bench_set_root_directory(args):
+    """
+    Listing a flat folder of size files into a FileViewWidget, then the same folder from the listing cache.
+    """
+    from libs.consts import FILE_NAME, FILE_PATH
+    from libs.widgets import FileViewWidget
+
+    qt_app()
+    root = generate_flat(flat_path(args.tree_dir, args.size), args.size)
+    view = FileViewWidget([FILE_NAME, FILE_PATH])
+    view.benchmark_root = root
+
+    cold = Timer()
+    wait_for_listing(view, cold)
+    rows = view.model().rowCount()
+
+    cached = Timer()
+    wait_for_listing(view, cached)
+    return cold.seconds, {"rows": rows, "cached_seconds": round(cached.seconds, 4)}
+
+
+def bench_add_item(args):
+    """
+    Adding size items one at a time to a FileTableWidget, and all at once to another.
+    """
+    from libs.consts import FILE_NAME, FILE_PATH
+    from libs.widgets import FileTableWidget
+
+    qt_app()
+    items = make_items(generate_flat(flat_path(args.tree_dir, args.size), args.size))
+
+    one_by_one = FileTableWidget([FILE_NAME, FILE_PATH])
+    timer = Timer()
+    with timer:
+        for item in items:
+            one_by_one.add_item(item)
+
+    batched = FileTableWidget([FILE_NAME, FILE_PATH])
+    batch_timer = Timer()
+    with batch_timer:
+        batched.add_items(items)
+    return timer.seconds, {"rows": len(items), "add_items_seconds": round(batch_timer.seconds, 4)}
+
+
+def bench_get_file_items(args):
+    """
+    MainWindow.get_file_items with half the tree in a browser and half in an unselected saved pin list,
+    first call and repeat.
+    """
+    qt_app()
+    import main_window
+    from libs.consts import FULL_PATH
+
+    items = make_items(generate_tree(tree_path(args.tree_dir, args.size, args.depth, args.fan_out),
+                                     args.size, args.depth, args.fan_out))
+    window = main_window.MainWindow()
+    window.set_browser_context(main_window.DOCK_WIDGET_VIEW_MODE)
+    browser = window.add_browser(set_path=False)
+    half = len(items) // 2
+    browser.table_view.add_items(items[:half])
+    pins = [{FULL_PATH: i.file_path(), "_is_dir": i.is_dir()} for i in items[half:]]
+    window.add_fav_list(items=pins, name="Benchmark", set_current=False)
+
+    first = Timer()
+    with first:
+        found = window.get_file_items()
+    repeat = Timer()
+    with repeat:
+        window.get_file_items()
+    return first.seconds, {"items": len(found), "repeat_seconds": round(repeat.seconds, 6)}
+
+
+def run_search(args, search_string: str, fuzzy=False, recursive=False):
+    """
+    One search on the search thread's code path, run on this thread.
+    :return: seconds, extra
+    """
+    from libs import utils
+
+    qt_app()
+    root = generate_tree(tree_path(args.tree_dir, args.size, args.depth, args.fan_out),
+                         args.size, args.depth, args.fan_out)
+    thread = utils.Thread(max_results=args.max_results)
+    thread.set_fuzzy(fuzzy)
+    thread.set_search_recursive(recursive)
+
+    found = []
+    thread.signals.result.connect(lambda result: found.extend(result[1]))
+    thread.signals.ranked.connect(lambda result: found.__setitem__(slice(None), result[1]))
+
+    if recursive:
+        from libs.consts import FULL_PATH
+        from libs.widgets import FileItem
+        items = [FileItem({FULL_PATH: root.replace('\\', '/')}, True)]
+    else:
+        items = make_items(root)
+
+    timer = Timer()
+    with timer:
+        thread.search(thread.generation(), search_string, items, 1)
+    return timer.seconds, {"items": len(items), "results": len(found)}
+
+
+def bench_search_substring(args):
+    return run_search(args, "file_00012")
+
+
+def bench_search_regex(args):
+    return run_search(args, r"file_\d+5\.py$")
+
+
+def bench_search_fuzzy(args):
+    return run_search(args, "f0012py", fuzzy=True)
+
+
+def bench_search_recursive(args):
+    """
+    Search Sub-Folders from the tree root, walking the disk.
+    """
+    return run_search(args, "file_00012", recursive=True)
+
+
+def bench_save_load(args):
+    """
+    Saving a pin list of size pins to browser_data.json and loading it again.
+    """
+    from libs.persistence import DataStore
+
+    qt_app()
+    pins = [{"_full_path": "C:/Projects/assets/dir_{:04d}/file_{:07d}.png".format(i // 1000, i),
+             "_is_dir": False} for i in range(args.size)]
+    path = os.path.join(tempfile.mkdtemp(prefix="file-browser-bench-"), "browser_data.json")
+
+    store = DataStore(path)
+    store.load()
+    save = Timer()
+    with save:
+        store.add_list("Benchmark", pins)
+        store.compact()
+        store.close()
+
+    load = Timer()
+    with load:
+        loaded = DataStore(path)
+        pin_lists = loaded.load()
+        loaded.close()
+    return save.seconds, {"load_seconds": round(load.seconds, 4), "pins": len(pin_lists[0]["fav_widget_pins"]),
+                          "file_bytes": os.path.getsize(path)}
+
+
+BENCHMARKS = {
+    "set_root_directory": bench_set_root_directory,
+    "add_item": bench_add_item,
+    "get_file_items": bench_get_file_items,
+    "search_substring": bench_search_substring,
+    "search_regex": bench_search_regex,
+    "search_fuzzy": bench_search_fuzzy,
+    "search_recursive": bench_search_recursive,
+    "save_load": bench_save_load,
+}
+
+
+def run_one(args):
+    seconds, extra = BENCHMARKS[args.run](args)
+    return {"benchmark": args.run,
+            "size": args.size,
+            "seconds": round(seconds, 4),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "extra": extra}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--fan-out", type=int, default=DEFAULT_FAN_OUT)
+    parser.add_argument("--benchmarks", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--max-results", type=int, default=20000)
+    parser.add_argument("--tree-dir", default=DEFAULT_TREE_DIR)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--run", choices=sorted(BENCHMARKS), help="Run one benchmark in this process.")
+    parser.add_argument("--size", type=int, help="Tree size for --run.")
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_one(args)))
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for size in args.sizes:
+        for name in args.benchmarks:
+            command = [sys.executable, "-m", "benchmarks.hot_paths", "--run", name, "--size", str(size),
+                       "--depth", str(args.depth), "--fan-out", str(args.fan_out),
+                       "--max-results", str(args.max_results), "--tree-dir", args.tree_dir]
+            try:
+                output = subprocess.check_output(command, cwd=repo_root)
+                result = json.loads(output.decode().strip().splitlines()[-1])
+            except (subprocess.CalledProcessError, ValueError, IndexError) as ex:
+                result = {"benchmark": name, "size": size, "error": str(ex)}
+            results.append(result)
+
+            if "error" in result:
+                print("{:>20} {:>9,}: failed, {}".format(name, size, result["error"]))
+            else:
+                print("{benchmark:>20} {size:>9,}: {seconds:>9.4f}s  peak rss {peak_rss_bytes:>13,} B  "
+                      "{extra}".format(**result))
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": sys.version.split()[0],
+              "platform": platform.platform(),
+              "depth": args.depth,
+              "fan_out": args.fan_out,
+              "results": results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print("Wrote {}".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -33,6 +33,7 @@ FILE_ITEM_DATA_ROLE = Qt.UserRole + 2
 # DROP ACTIONS
 # Specify what we want to do when dragging or dropping items
 USE_FILE_ITEM_ACTION = 'USE_FILE_ITEM'
+FILE_ITEM_MIME_TYPE = 'application/x-file-browser-item'
 
 
 TOOL_BAR_BUTTON_WIDTH = 40
@@ -47,14 +48,45 @@ TAB_VIEW_MODE = "Tabs"
 TABLE_VIEW_MODE = "table_view_mode"
 LIST_VIEW_MODE = "list_view_mode"
 
+# List view grid, every cell has the same size so the view never measures items.
+LIST_VIEW_GRID_WIDTH = 220
+LIST_VIEW_ICON_SIZE = 16
+LIST_VIEW_BATCH_SIZE = 2000  # Items laid out per event loop pass.
+
+# Search Modes, in the order of the search options combo box.
+SEARCH_EVERYWHERE = 0
+SEARCH_FAVORITE_LIST = 1
+SEARCH_ACTIVE_BROWSER = 2
+
+
+# Directory watching, changes are coalesced for WATCH_REFRESH_DELAY ms but never held back for longer
+# than WATCH_MAX_REFRESH_DELAY ms.
+WATCH_REFRESH_DELAY = 250
+WATCH_MAX_REFRESH_DELAY = 1000
+
+# Folder sizes that finish within this many ms of each other are repainted together.
+FOLDER_SIZE_REPAINT_DELAY = 50
+
 
 # display keys (FileItem attributes), what columns to show
 FILE_NAME = "file_name"
 FILE_PATH = "file_path"
+FILE_SIZE = "file_size"
+DATE_MODIFIED = "date_modified"
+DATE_CREATED = "date_created"
+FILE_KIND = "file_kind"
+PERMISSIONS = "permissions"
+
+# Columns read from the listing's stat results, a listing only stats its entries when one of these is shown.
+STAT_DISPLAY_KEYS = (FILE_SIZE, DATE_MODIFIED, DATE_CREATED, PERMISSIONS)
+# Columns of the browser views, the ones after FILE_PATH start hidden.
+BROWSER_DISPLAY_KEYS = [FILE_NAME, FILE_PATH, FILE_SIZE, DATE_MODIFIED, DATE_CREATED, FILE_KIND, PERMISSIONS]
 
 FULL_PATH = "_full_path"
 
 FILE_COLOR = "_color"
+DATE_ADDED = "_date_added"  # Time a pin was added, saved with the pin.
+DEFAULT_ITEM_COLOR = (1.0, 1.0, 1.0, 1.0)
 
 
 CAN_SAVE_SETTINGS = True
\ No newline at end of file
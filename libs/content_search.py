@@ -0,0 +1,179 @@
+"""
+File content search.
+
+ContentSearcher greps files for a pattern on a pool of worker processes. Workers memory map each file and
+run a bytes regex over the whole mapping, so there is no per line Python work unless a line matches.
+Files are handed out in small chunks so results stream back and a cancelled search stops quickly.
+
+This module must stay free of Qt imports, it is imported by the worker processes.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import logging
+import mmap
+import os
+import re
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+MAX_CONTENT_FILE_SIZE = 64 * 1024 * 1024
+MAX_MATCHES_PER_FILE = 100
+MAX_LINE_LENGTH = 200
+BINARY_CHECK_SIZE = 8192
+FILES_PER_TASK = 32
+MAX_CONTENT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+ContentMatch = namedtuple("ContentMatch", ["path", "line_number", "line"])
+
+
+def parse_file_types(text: str):
+    """
+    Suffixes from the "Content File Types" option, IE: ".txt .html .py" or "txt, py".
+    :return: set of lowercase suffixes with a leading dot, empty means every file type.
+    """
+    if not text:
+        return set()
+    types = set()
+    for t in re.split(r"[\s,;]+", text.strip()):
+        t = t.strip().lstrip("*").lower()
+        if t:
+            types.add(t if t.startswith(".") else "." + t)
+    return types
+
+
+def has_file_type(path: str, file_types: set):
+    return not file_types or os.path.splitext(path)[1].lower() in file_types
+
+
+def compile_content_pattern(search_string: str, match_case=False):
+    flags = 0 if match_case else re.IGNORECASE
+    raw = search_string.encode("utf-8")
+    try:
+        return re.compile(raw, flags)
+    except re.error:
+        return re.compile(re.escape(raw), flags)
+
+
+def grep_file(path: str, pattern, max_file_size=MAX_CONTENT_FILE_SIZE):
+    """
+    :return: list of ContentMatch, empty for binary, empty or too large files.
+    """
+    matches = []
+    try:
+        size = os.path.getsize(path)
+        if not size or size > max_file_size:
+            return matches
+
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b"\0", 0, BINARY_CHECK_SIZE) != -1:
+                    return matches
+
+                line_number = 1
+                counted_to = 0
+                last_line_start = -1
+                for m in pattern.finditer(mm):
+                    start = m.start()
+                    line_start = mm.rfind(b"\n", 0, start) + 1
+                    if line_start == last_line_start:
+                        continue  # One result per line.
+
+                    line_number += mm[counted_to:line_start].count(b"\n")
+                    counted_to = line_start
+                    last_line_start = line_start
+
+                    line_end = mm.find(b"\n", start)
+                    if line_end == -1:
+                        line_end = size
+                    line = mm[line_start:min(line_end, line_start + MAX_LINE_LENGTH)]
+                    matches.append(ContentMatch(path, line_number, line.decode("utf-8", "replace").strip()))
+
+                    if len(matches) >= MAX_MATCHES_PER_FILE:
+                        break
+    except (OSError, ValueError):
+        pass
+    return matches
+
+
+def grep_files(paths: list, search_string: str, match_case: bool, max_file_size: int):
+    """
+    Worker process entry point.
+    """
+    pattern = compile_content_pattern(search_string, match_case)
+    matches = []
+    for path in paths:
+        matches.extend(grep_file(path, pattern, max_file_size))
+    return matches
+
+
+class ContentSearcher:
+    """
+    Keeps a process pool around between searches, starting processes is slow on Windows.
+    """
+
+    def __init__(self, max_workers=MAX_CONTENT_WORKERS, max_file_size=MAX_CONTENT_FILE_SIZE):
+        self._max_workers = max_workers
+        self._max_file_size = max_file_size
+        self._executor = None
+
+    def set_max_file_size(self, max_file_size: int):
+        self._max_file_size = max_file_size
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+        return self._executor
+
+    def search(self, paths, search_string: str, match_case=False, is_cancelled=None):
+        """
+        Yield ContentMatches for the given file paths, a few chunks of files are in flight at any time.
+        :param paths: iterable of file paths, can be a generator that is still walking the disk.
+        :param is_cancelled: callable, stop early when it returns True.
+        """
+        is_cancelled = is_cancelled or (lambda: False)
+        executor = self.executor()
+        max_in_flight = self._max_workers * 2
+        in_flight = set()
+
+        paths = iter(paths)
+        chunk = []
+        exhausted = False
+        try:
+            while not is_cancelled():
+                # Top up the pool.
+                while not exhausted and len(in_flight) < max_in_flight:
+                    for path in paths:
+                        chunk.append(path)
+                        if len(chunk) >= FILES_PER_TASK:
+                            break
+                    else:
+                        exhausted = True
+
+                    if chunk:
+                        in_flight.add(executor.submit(grep_files, chunk, search_string, match_case,
+                                                      self._max_file_size))
+                        chunk = []
+
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        results = future.result()
+                    except Exception as ex:
+                        log.warning("Content search task failed: {}".format(ex))
+                        continue
+                    for match in results:
+                        yield match
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
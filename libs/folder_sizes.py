@@ -0,0 +1,331 @@
+"""
+Recursive folder sizes.
+
+FolderSizeJob adds up the size and file count of everything below a folder on a worker thread. Every folder
+it passes is recorded in FolderSizeCache with its mtime, the size and count of the files directly inside it
+and its sub folders. Going over the same tree again only stats each folder, a folder whose mtime did not
+change is not listed again. Totals are kept too, so sizes of folders we have seen show up right away while
+a job checks them.
+
+A change to a folder clears its record and the totals of every folder above it, nothing else.
+
+    job = FolderSizeJob(path)
+    job.signals.finished.connect(size_ready)  # path, (size, file count) or None
+    job.start()
+"""
+
+import json
+import logging
+import os
+import threading
+
+from PySide2 import QtCore
+from PySide2.QtCore import QObject, Signal
+
+from libs.consts import DATA_DIR
+from libs.persistence import ensure_directory, write_atomic
+from libs.tracing import span
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+FOLDER_SIZE_FILE_NAME = "folder_sizes.json"
+FOLDER_SIZE_VERSION = 1
+MAX_FOLDER_SIZE_THREADS = 2
+MAX_FOLDER_SIZE_RECORDS = 50000  # Most recently scanned folders kept on save.
+
+# Record fields
+_MTIME = 0
+_FILES_SIZE = 1
+_FILE_COUNT = 2
+_SUB_FOLDERS = 3
+_TOTAL_SIZE = 4
+_TOTAL_COUNT = 5
+
+_folder_size_pool = None
+_folder_size_cache = None
+
+
+def folder_size_pool():
+    """
+    Thread pool of the folder size jobs, created on first use. Kept apart from the listing pool so long
+    size jobs never hold up a listing.
+    """
+    global _folder_size_pool
+    if _folder_size_pool is None:
+        _folder_size_pool = QtCore.QThreadPool()
+        _folder_size_pool.setMaxThreadCount(MAX_FOLDER_SIZE_THREADS)
+    return _folder_size_pool
+
+
+def folder_size_cache():
+    """
+    Folder size cache shared by all browsers, loaded on first use.
+    """
+    global _folder_size_cache
+    if _folder_size_cache is None:
+        _folder_size_cache = FolderSizeCache(os.path.join(DATA_DIR, FOLDER_SIZE_FILE_NAME))
+        _folder_size_cache.load()
+    return _folder_size_cache
+
+
+def close_folder_size_cache():
+    """
+    Save the cache if it was used.
+    """
+    if _folder_size_cache is not None:
+        _folder_size_cache.save()
+
+
+def invalidate_folder_size(path: str):
+    """
+    FolderSizeCache.invalidate() without loading the cache, a cache that is not loaded shows no sizes and
+    its records are checked against the folder mtimes once it is used.
+    """
+    if _folder_size_cache is not None:
+        _folder_size_cache.invalidate(path)
+
+
+def folder_key(path: str):
+    return os.path.normcase(os.path.normpath(path))
+
+
+class FolderSizeCache:
+    """
+    Folder records keyed by the normalized folder path, thread safe.
+    """
+
+    def __init__(self, path: str, max_records=MAX_FOLDER_SIZE_RECORDS):
+        self._path = path
+        self._max_records = max_records
+        self._records = {}  # key: [mtime, files size, file count, sub folder names, total size, total count]
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._records)
+
+    def total(self, path: str):
+        """
+        :return: (size, file count) from the last scan, None if unknown or invalidated since.
+        """
+        record = self._records.get(folder_key(path))
+        if record is None or record[_TOTAL_SIZE] is None:
+            return None
+        return record[_TOTAL_SIZE], record[_TOTAL_COUNT]
+
+    def invalidate(self, path: str):
+        """
+        Something in the folder changed, forget its record and the totals of the folders above it.
+        """
+        key = folder_key(path)
+        with self._lock:
+            if self._records.pop(key, None) is not None:
+                self._dirty = True
+            self._invalidate_parents(key)
+
+    def scan(self, path: str, is_cancelled=None):
+        """
+        Total size and file count of everything below path, symlinks are not followed.
+        :return: (size, file count), None if cancelled or the folder can not be read.
+        """
+        key = folder_key(path)
+        previous = self.total(path)
+        with span("folder_sizes.scan", "folder_sizes", path=path):
+            try:
+                total = self._scan(path, key, is_cancelled)
+            except OSError as ex:
+                log.warning("Could not size {}: {}".format(path, ex))
+                return None
+
+        # The folders above include this one, their totals are out of date now.
+        if total is not None and total != previous:
+            with self._lock:
+                self._invalidate_parents(key)
+        return total
+
+    # Persistence
+    # ========================================
+    def load(self):
+        if not os.path.exists(self._path):
+            return
+
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as ex:
+            log.error("Could not read folder sizes {}: {}".format(self._path, ex))
+            return
+
+        if data.get("version") != FOLDER_SIZE_VERSION:
+            log.warning("Unknown folder sizes version {}, starting over".format(data.get("version")))
+            return
+
+        with self._lock:
+            self._records = {folder_key(p): [mtime, size, count, tuple(sub_folders), total_size, total_count]
+                             for p, mtime, size, count, sub_folders, total_size, total_count in data.get("folders", [])}
+            self._dirty = False
+        log.debug("Loaded {} folder sizes".format(len(self._records)))
+
+    def save(self):
+        """
+        Write the records if they changed, only the most recently scanned MAX_FOLDER_SIZE_RECORDS are kept.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            while len(self._records) > self._max_records:
+                del self._records[next(iter(self._records))]
+            folders = [[k] + r[:_SUB_FOLDERS] + [list(r[_SUB_FOLDERS])] + r[_TOTAL_SIZE:]
+                       for k, r in self._records.items()]
+            self._dirty = False
+
+        try:
+            ensure_directory(self._path)
+            write_atomic(self._path, json.dumps({"version": FOLDER_SIZE_VERSION, "folders": folders},
+                                                separators=(',', ':')))
+        except OSError as ex:
+            log.error("Could not save folder sizes {}: {}".format(self._path, ex))
+            self._dirty = True
+
+    # Internal
+    # ========================================
+    def _scan(self, path: str, key: str, is_cancelled):
+        """
+        Depth first with an explicit stack, trees can be deeper than the recursion limit.
+        """
+        visited = set()
+        stack = [self._open_folder(path, key, visited)]
+        if stack[0] is None:
+            return 0, 0
+
+        while stack:
+            folder = stack[-1]
+            if folder.next_sub_folder < len(folder.sub_folders):
+                if is_cancelled and is_cancelled():
+                    return None
+                sub_path = os.path.join(folder.path, folder.sub_folders[folder.next_sub_folder])
+                folder.next_sub_folder += 1
+                try:
+                    sub_folder = self._open_folder(sub_path, folder_key(sub_path), visited)
+                except OSError:
+                    continue  # Gone or no access, counts as empty.
+                if sub_folder is not None:
+                    stack.append(sub_folder)
+                continue
+
+            # All sub folders are added up.
+            stack.pop()
+            with self._lock:
+                # Re-inserted so the most recently scanned folders are last, save() drops from the front.
+                self._records.pop(folder.key, None)
+                self._records[folder.key] = [folder.mtime, folder.files_size, folder.file_count, folder.sub_folders,
+                                             folder.total_size, folder.total_count]
+                self._dirty = True
+
+            if stack:
+                stack[-1].total_size += folder.total_size
+                stack[-1].total_count += folder.total_count
+
+        return folder.total_size, folder.total_count
+
+    def _open_folder(self, path: str, key: str, visited: set):
+        """
+        :return: _ScanFolder, None if the folder was already visited through another path.
+        """
+        st = os.stat(path)
+        # Junctions and mount points can lead back up the tree.
+        if (st.st_dev, st.st_ino) in visited:
+            return None
+        visited.add((st.st_dev, st.st_ino))
+
+        record = self._records.get(key)
+        if record is not None and record[_MTIME] == st.st_mtime_ns:
+            return _ScanFolder(path, key, st.st_mtime_ns, *record[_FILES_SIZE:_TOTAL_SIZE])
+        return _ScanFolder(path, key, st.st_mtime_ns, *self._list(path))
+
+    @staticmethod
+    def _list(path: str):
+        files_size = 0
+        file_count = 0
+        sub_folders = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_folders.append(entry.name)
+                    else:
+                        files_size += entry.stat(follow_symlinks=False).st_size
+                        file_count += 1
+                except OSError:
+                    pass
+        return files_size, file_count, tuple(sub_folders)
+
+    def _invalidate_parents(self, key: str):
+        """
+        Lock held.
+        """
+        parent = os.path.dirname(key)
+        while parent and parent != key:
+            record = self._records.get(parent)
+            if record is not None and record[_TOTAL_SIZE] is not None:
+                record[_TOTAL_SIZE] = None
+                record[_TOTAL_COUNT] = None
+                self._dirty = True
+            key, parent = parent, os.path.dirname(parent)
+
+
+class _ScanFolder:
+    """
+    A folder on the scan stack.
+    """
+    __slots__ = ("path", "key", "mtime", "files_size", "file_count", "sub_folders", "next_sub_folder",
+                 "total_size", "total_count")
+
+    def __init__(self, path, key, mtime, files_size, file_count, sub_folders):
+        self.path = path
+        self.key = key
+        self.mtime = mtime
+        self.files_size = files_size
+        self.file_count = file_count
+        self.sub_folders = sub_folders
+        self.next_sub_folder = 0
+        self.total_size = files_size
+        self.total_count = file_count
+
+
+class FolderSizeSignals(QObject):
+    finished = Signal(str, object)  # path, (size, file count) or None when cancelled or failed
+
+
+class FolderSizeJob(QtCore.QRunnable):
+    """
+    Sizes one folder on the folder size pool.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.signals = FolderSizeSignals()
+        self._path = path
+        self._cancelled = False
+
+    def path(self):
+        return self._path
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def start(self):
+        folder_size_pool().start(self)
+
+    def run(self):
+        total = None
+        if not self._cancelled:
+            total = folder_size_cache().scan(self._path, self.is_cancelled)
+        self.signals.finished.emit(self._path, None if self._cancelled else total)
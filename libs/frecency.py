@@ -0,0 +1,273 @@
+"""
+Access tracking for "Most accessed" ordering.
+
+Every open and navigation adds to the frecency score of its path, a score halves every FRECENCY_HALF_LIFE so
+recent use counts more than old use. Scores are not decayed on a timer, each path stores its score as of a
+shared reference time (the epoch):
+
+    value = sum(weight * 2 ** ((access_time - epoch) / half_life))
+    score = value * 2 ** ((epoch - now) / half_life)
+
+An access is one addition, and since every path decays by the same factor the stored values rank paths
+without working out any score. The epoch is moved up when the values get large, which rescales them all.
+
+    store = access_store()
+    store.record(path, WEIGHT_OPEN)
+    store.score(path)
+    store.complete("C:/Us")  # Most used folders starting with the text.
+
+Changes are written on a writer thread at most FRECENCY_SAVE_DELAY after an access, close() waits for them.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import threading
+import time
+
+from PySide2 import QtCore
+
+from libs.consts import DATA_DIR
+from libs.persistence import ensure_directory, write_atomic
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+FRECENCY_FILE_NAME = "access_scores.json"
+FRECENCY_VERSION = 1
+FRECENCY_HALF_LIFE = 14 * 24 * 3600  # Seconds.
+MAX_EPOCH_HALF_LIVES = 256  # Rebase before the stored values get near the float range.
+MIN_FRECENCY_SCORE = 0.001  # Paths below this are forgotten on save.
+MAX_FRECENCY_ENTRIES = 5000
+FRECENCY_SAVE_DELAY = 30000  # ms, record() saves at most this often, close() always does.
+MAX_COMPLETIONS = 20
+
+WEIGHT_OPEN = 1.0
+WEIGHT_NAVIGATE = 0.5
+
+# Entry fields, entries are short lists so an access updates one in place.
+_PATH = 0
+_VALUE = 1
+_IS_DIR = 2
+
+_access_store = None
+
+
+def access_store():
+    """
+    Access store shared by the whole application, loaded on first use.
+    """
+    global _access_store
+    if _access_store is None:
+        _access_store = AccessStore(os.path.join(DATA_DIR, FRECENCY_FILE_NAME))
+        _access_store.load()
+    return _access_store
+
+
+def access_key(path: str):
+    """
+    Paths are tracked by their normalized form, IE: C:/Users and c:\\users\\ are the same folder on Windows.
+    """
+    return os.path.normcase(os.path.normpath(path))
+
+
+class AccessStore:
+    """
+    Decaying access scores by path. Thread safe, the search thread reads a snapshot with scores().
+    """
+
+    def __init__(self, path: str, half_life=FRECENCY_HALF_LIFE):
+        self._path = path
+        self._half_life = half_life
+        self._epoch = time.time()
+        self._entries = {}  # access key: [path, value, is_dir]
+
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._save_timer = None  # Made by the first record(), it lives on the thread that records.
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="access-store")
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Scores
+    # ========================================
+    def record(self, path: str, weight=WEIGHT_OPEN, is_dir=False, now=None):
+        """
+        Add an access of path.
+        :param weight: WEIGHT_OPEN or WEIGHT_NAVIGATE
+        :param now: time.time() of the access, defaults to now.
+        """
+        now = time.time() if now is None else now
+        key = access_key(path)
+        with self._lock:
+            if (now - self._epoch) / self._half_life > MAX_EPOCH_HALF_LIVES:
+                self._rebase(now)
+
+            gain = weight * 2 ** ((now - self._epoch) / self._half_life)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [path, gain, is_dir]
+            else:
+                entry[_PATH] = path
+                entry[_VALUE] += gain
+                entry[_IS_DIR] = is_dir
+            self._dirty = True
+
+        if self._save_timer is None:
+            self._save_timer = QtCore.QTimer()
+            self._save_timer.setSingleShot(True)
+            self._save_timer.setInterval(FRECENCY_SAVE_DELAY)
+            self._save_timer.timeout.connect(self.save)
+        if not self._save_timer.isActive():
+            self._save_timer.start()
+
+    def rank(self, key: str):
+        """
+        Ranking value of an access key, higher ranks first. Only comparable to other ranks of this store.
+        :return: float, 0.0 if the path was never accessed.
+        """
+        entry = self._entries.get(key)
+        return entry[_VALUE] if entry is not None else 0.0
+
+    def score(self, path: str, now=None):
+        """
+        :return: float, the decayed score of path, one open right now scores WEIGHT_OPEN.
+        """
+        now = time.time() if now is None else now
+        return self.rank(access_key(path)) * self._decay(now)
+
+    def scores(self, now=None):
+        """
+        :return: {access key: score} of every tracked path, a copy.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            decay = self._decay(now)
+            return {k: e[_VALUE] * decay for k, e in self._entries.items()}
+
+    def most_accessed(self, limit: int, dirs_only=False):
+        """
+        :return: list of paths, highest score first.
+        """
+        with self._lock:
+            entries = [e for e in self._entries.values() if e[_IS_DIR] or not dirs_only]
+        entries.sort(key=lambda e: e[_VALUE], reverse=True)
+        return [e[_PATH] for e in entries[:limit]]
+
+    def complete(self, text: str, limit=MAX_COMPLETIONS):
+        """
+        Folders that start with text, for the path line edit.
+        :return: list of paths, highest score first.
+        """
+        if not text:
+            return []
+        prefix = os.path.normcase(text)
+        with self._lock:
+            matches = [e for k, e in self._entries.items() if e[_IS_DIR] and k.startswith(prefix)]
+        matches.sort(key=lambda e: e[_VALUE], reverse=True)
+        return [e[_PATH] for e in matches[:limit]]
+
+    def forget(self, path: str):
+        with self._lock:
+            if self._entries.pop(access_key(path), None) is not None:
+                self._dirty = True
+
+    # Persistence
+    # ========================================
+    def load(self):
+        """
+        Read the saved scores, a missing or unreadable file starts an empty store.
+        """
+        if not os.path.exists(self._path):
+            return
+
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as ex:
+            log.error("Could not read access scores {}: {}".format(self._path, ex))
+            return
+
+        if data.get("version") != FRECENCY_VERSION:
+            log.warning("Unknown access scores version {}, starting over".format(data.get("version")))
+            return
+
+        epoch = data.get("epoch", self._epoch)
+        half_life = data.get("half_life", self._half_life)
+        # Saved with another half life, carry the current scores over and decay at the new rate from now on.
+        now = time.time()
+        scale = 2 ** ((epoch - now) / half_life) if half_life != self._half_life else 1.0
+        with self._lock:
+            self._epoch = epoch if scale == 1.0 else now
+            self._entries = {}
+            for path, value, is_dir in data.get("entries", []):
+                self._entries[access_key(path)] = [path, value * scale, bool(is_dir)]
+            self._dirty = False
+
+        log.debug("Loaded {} access scores".format(len(self._entries)))
+
+    def save(self):
+        """
+        Hand the scores to the writer thread if they changed. Faded paths are dropped and only the best
+        MAX_FRECENCY_ENTRIES kept, so the file stays small however long the history is.
+        """
+        if self._save_timer is not None:
+            self._save_timer.stop()
+        with self._lock:
+            if not self._dirty:
+                return
+            self.prune(time.time())
+            data = {"version": FRECENCY_VERSION, "epoch": self._epoch, "half_life": self._half_life,
+                    "entries": [[e[_PATH], e[_VALUE], int(e[_IS_DIR])] for e in self._entries.values()]}
+            self._dirty = False
+        self._writer.submit(self._write, data)
+
+    def close(self):
+        """
+        Save and wait for the writer.
+        """
+        self.save()
+        self._writer.shutdown(wait=True)
+
+    # Internal
+    # ========================================
+    def prune(self, now: float):
+        """
+        Lock held.
+        """
+        min_value = MIN_FRECENCY_SCORE / self._decay(now)
+        entries = [(k, e) for k, e in self._entries.items() if e[_VALUE] >= min_value]
+        if len(entries) > MAX_FRECENCY_ENTRIES:
+            entries.sort(key=lambda i: i[1][_VALUE], reverse=True)
+            del entries[MAX_FRECENCY_ENTRIES:]
+        if len(entries) != len(self._entries):
+            self._entries = dict(entries)
+
+    def _write(self, data: dict):
+        """
+        Writer thread.
+        """
+        for entry in data["entries"]:
+            entry[_VALUE] = float("{:.6g}".format(entry[_VALUE]))
+        try:
+            ensure_directory(self._path)
+            write_atomic(self._path, json.dumps(data, separators=(',', ':')))
+        except OSError as ex:
+            log.error("Could not save access scores {}: {}".format(self._path, ex))
+            with self._lock:
+                self._dirty = True
+
+    def _decay(self, now: float):
+        return 2 ** ((self._epoch - now) / self._half_life)
+
+    def _rebase(self, now: float):
+        """
+        Move the epoch to now, lock held.
+        """
+        decay = self._decay(now)
+        for entry in self._entries.values():
+            entry[_VALUE] *= decay
+        self._epoch = now
@@ -0,0 +1,166 @@
+"""
+Fuzzy path matching.
+
+A query matches a path when its characters appear in the path in order. Matches are scored so the ones a
+person means come first: characters in the file name count more than characters in the folders, characters
+at the start of a word (after a separator or a lower to upper case change) get a bonus, and so do runs of
+consecutive characters. Gaps between matched characters cost a little.
+
+TopK keeps the best results of a scan in a bounded heap, so ranking never sorts all candidates.
+"""
+
+import heapq
+import itertools
+
+SCORE_MATCH = 16
+BONUS_BASENAME = 8
+BONUS_BOUNDARY = 10
+BONUS_FIRST_CHAR = 8
+BONUS_CONSECUTIVE = 6
+PENALTY_GAP = 1
+MAX_GAP_PENALTY = 10
+
+SEPARATORS = set("/\\_-. ")
+
+
+def fold_case(text: str):
+    """
+    Lowercase text without changing its length, so offsets into the result are offsets into text.
+    A character whose lowercase is longer, IE: 'İ', is replaced by the first character of it.
+    """
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return "".join(c.lower()[0] for c in text)
+
+
+def is_subsequence(query: str, text: str):
+    pos = 0
+    for c in query:
+        pos = text.find(c, pos)
+        if pos == -1:
+            return False
+        pos += 1
+    return True
+
+
+def _match_window(query: str, text: str, start: int):
+    """
+    Find the shortest window text[begin:end] starting at or after start that contains the query in order.
+    Forward pass to find the end, backward pass to pull the beginning as close to it as possible.
+    :return: (begin, end) or None
+    """
+    pos = start
+    for c in query:
+        pos = text.find(c, pos)
+        if pos == -1:
+            return None
+        pos += 1
+    end = pos
+
+    pos = end
+    for c in reversed(query):
+        pos = text.rfind(c, start, pos)
+    return pos, end
+
+
+def _score_window(query: str, text: str, original: str, begin: int, end: int, name_start: int):
+    score = 0
+    previous = -2
+    pos = begin
+    for c in query:
+        pos = text.find(c, pos, end)
+
+        score += SCORE_MATCH
+        if pos >= name_start:
+            score += BONUS_BASENAME
+
+        if pos == 0 or original[pos - 1] in SEPARATORS:
+            score += BONUS_BOUNDARY
+            if pos == name_start:
+                score += BONUS_FIRST_CHAR
+        elif original[pos].isupper() and original[pos - 1].islower():
+            score += BONUS_BOUNDARY
+
+        if pos == previous + 1:
+            score += BONUS_CONSECUTIVE
+        elif previous >= 0:
+            score -= min(MAX_GAP_PENALTY, (pos - previous - 1) * PENALTY_GAP)
+
+        previous = pos
+        pos += 1
+    return score
+
+
+def fuzzy_score(query: str, path: str, match_case=False):
+    """
+    Score how well the path matches the query, higher is better.
+    :param query: fold_case(query) unless match_case.
+    :return: int, or None if the path does not match.
+    """
+    text = path if match_case else fold_case(path)
+    if not is_subsequence(query, text):
+        return None
+
+    name_start = max(path.rfind('/'), path.rfind('\\')) + 1
+
+    # Prefer a match inside the file name, fall back to the whole path.
+    window = _match_window(query, text, name_start)
+    if window is None:
+        window = _match_window(query, text, 0)
+
+    score = _score_window(query, text, path, window[0], window[1], name_start)
+    # Shorter paths win ties.
+    return score * 1024 - min(1023, len(path))
+
+
+class TopK:
+    """
+    Bounded min heap keeping the k best scored values.
+    """
+
+    def __init__(self, k: int):
+        self._k = k
+        self._heap = []
+        self._counter = itertools.count()
+        self._changed = False
+
+    def __len__(self):
+        return len(self._heap)
+
+    def min_score(self):
+        if len(self._heap) < self._k:
+            return None
+        return self._heap[0][0]
+
+    def push(self, score, value):
+        """
+        :return: True if the value made it into the top k.
+        """
+        if self._k <= 0:
+            return False
+
+        # Later values lose ties, so the order of equal scores is the scan order.
+        entry = (score, -next(self._counter), value)
+        if len(self._heap) < self._k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+        else:
+            return False
+        self._changed = True
+        return True
+
+    def changed(self):
+        """
+        True if the top k changed since the last call.
+        """
+        changed = self._changed
+        self._changed = False
+        return changed
+
+    def ranked(self):
+        """
+        :return: [(score, value)] best first.
+        """
+        return [(score, value) for score, _, value in sorted(self._heap, reverse=True)]
@@ -0,0 +1,154 @@
+"""
+Icon lookup for FileItems.
+
+Asking QFileIconProvider for an icon is by far the slowest part of showing a directory, and almost every
+file of the same type gets the same icon. IconCache keys icons by kind and suffix, only types that carry
+their own icon (executables, shortcuts, icon files) are cached per path.
+
+Views don't wait for icons, IconCache.icon_or_request returns a generic placeholder and queues the lookup.
+Queued lookups are resolved a few milliseconds at a time on the GUI thread and icon_ready is emitted with
+the key so models can repaint the rows waiting on it.
+"""
+
+from collections import OrderedDict
+import logging
+import os
+import time
+
+from PySide2 import QtCore, QtWidgets
+from PySide2.QtCore import QObject, Signal
+
+from libs.tracing import span
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+# File types that have a different icon for every file.
+PER_FILE_ICON_SUFFIXES = {".exe", ".lnk", ".ico", ".url", ".cur", ".ani", ".scr", ".msc", ".appref-ms"}
+
+MAX_PATH_ICONS = 4096
+RESOLVE_TIME_BUDGET = 0.008  # Seconds spent resolving icons per event loop pass.
+
+DIR_KIND = "dir"
+FILE_KIND = "file"
+PATH_KIND = "path"
+
+_icon_provider = None
+_icon_cache = None
+
+
+def icon_provider():
+    global _icon_provider
+    if _icon_provider is None:
+        _icon_provider = QtWidgets.QFileIconProvider()
+    return _icon_provider
+
+
+def icon_cache():
+    """
+    Icon cache shared by all views, created on first use.
+    """
+    global _icon_cache
+    if _icon_cache is None:
+        _icon_cache = IconCache()
+    return _icon_cache
+
+
+def icon_key(path: str, is_dir: bool):
+    if is_dir:
+        return DIR_KIND, ""
+
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in PER_FILE_ICON_SUFFIXES:
+        return PATH_KIND, path
+    return FILE_KIND, suffix
+
+
+class IconCache(QObject):
+    icon_ready = Signal(object)  # icon key
+
+    def __init__(self, max_path_icons=MAX_PATH_ICONS):
+        super().__init__()
+        self._type_icons = {}
+        self._path_icons = OrderedDict()
+        self._max_path_icons = max_path_icons
+
+        # Lookups waiting to be resolved, key: path of a file with that key.
+        self._pending = OrderedDict()
+        self._placeholders = {}
+
+        self._resolve_timer = QtCore.QTimer(self)
+        self._resolve_timer.setSingleShot(True)
+        self._resolve_timer.timeout.connect(self.resolve_pending)
+
+    def cached_icon(self, key):
+        if key[0] == PATH_KIND:
+            icon = self._path_icons.get(key)
+            if icon is not None:
+                self._path_icons.move_to_end(key)
+            return icon
+        return self._type_icons.get(key)
+
+    def icon(self, item):
+        """
+        Icon of a FileItem, resolved right away if it is not cached yet.
+        """
+        key = icon_key(item.file_path(), item.is_dir())
+        icon = self.cached_icon(key)
+        if icon is None:
+            icon = self._resolve(key, item.file_path())
+        return icon
+
+    def icon_or_request(self, item):
+        """
+        :return: (icon, pending key), when the lookup had to be queued the icon is a placeholder and
+        icon_ready will be emitted with the pending key, otherwise the key is None.
+        """
+        is_dir = item.is_dir()
+        key = icon_key(item.file_path(), is_dir)
+        icon = self.cached_icon(key)
+        if icon is not None:
+            return icon, None
+
+        # The most recent requests are the rows on screen right now, resolve those first.
+        self._pending[key] = item.file_path()
+        self._pending.move_to_end(key)
+        if not self._resolve_timer.isActive():
+            self._resolve_timer.start(0)
+        return self.placeholder(is_dir), key
+
+    def placeholder(self, is_dir: bool):
+        icon = self._placeholders.get(is_dir)
+        if icon is None:
+            kind = QtWidgets.QFileIconProvider.Folder if is_dir else QtWidgets.QFileIconProvider.File
+            icon = icon_provider().icon(kind)
+            self._placeholders[is_dir] = icon
+        return icon
+
+    def resolve_pending(self):
+        start = time.monotonic()
+        with span("icons.resolve_pending", "icons", pending=len(self._pending)):
+            while self._pending and time.monotonic() - start < RESOLVE_TIME_BUDGET:
+                key, path = self._pending.popitem(last=True)
+                if self.cached_icon(key) is None:
+                    self._resolve(key, path)
+                self.icon_ready.emit(key)
+
+        if self._pending:
+            self._resolve_timer.start(0)
+
+    def clear(self):
+        self._type_icons.clear()
+        self._path_icons.clear()
+        self._pending.clear()
+
+    def _resolve(self, key, path):
+        icon = icon_provider().icon(QtCore.QFileInfo(path))
+        if key[0] == PATH_KIND:
+            self._path_icons[key] = icon
+            while len(self._path_icons) > self._max_path_icons:
+                self._path_icons.popitem(last=False)
+        else:
+            self._type_icons[key] = icon
+        return icon
@@ -0,0 +1,534 @@
+"""
+Persistent filename index.
+
+FileIndex holds every file and folder below a set of root directories (the pin lists and open browsers)
+so searches don't have to walk the disk. Names are stored once per entry with the id of their parent folder,
+and a trigram posting list per three lowercase characters lets substring and regex searches only look at
+entries that can possibly match.
+
+The index is saved to DATA_DIR and loaded at startup as is. Refreshing it only lists folders whose mtime has
+changed since they were indexed, everything else is kept.
+"""
+
+from array import array
+import logging
+import os
+import pickle
+import threading
+import time
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+from PySide2 import QtCore
+from PySide2.QtCore import QObject, Signal
+
+from libs.consts import *
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+INDEX_FORMAT_VERSION = 1
+INDEX_FILE_NAME = "file_index.pickle"
+MAX_INDEX_ENTRIES = 5000000
+COMPACT_RATIO = 0.3  # Rebuild the index when this much of it is deleted entries.
+
+# Entry flags
+IS_DIR = 1
+DELETED = 2
+
+_file_index = None
+
+
+def file_index():
+    """
+    Filename index shared by the application, created empty on first use. Use load() or an IndexUpdater
+    to fill it from disk.
+    """
+    global _file_index
+    if _file_index is None:
+        _file_index = FileIndex(os.path.join(DATA_DIR, INDEX_FILE_NAME))
+    return _file_index
+
+
+def trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def join_path(parent_path: str, name: str):
+    return parent_path.rstrip('/') + '/' + name
+
+
+def required_literals(search_string: str, regex=True):
+    """
+    Literal strings any match of the search string has to contain, lowercased.
+    Only top level literal runs of a regex are used, anything inside groups, repeats or alternations is skipped.
+    """
+    if not regex:
+        return [search_string.lower()]
+
+    try:
+        parsed = sre_parse.parse(search_string)
+    except Exception:
+        return [search_string.lower()]
+
+    literals = []
+    current = []
+    for op, value in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(chr(value))
+            continue
+
+        if current:
+            literals.append("".join(current).lower())
+            current = []
+
+        # An alternation at the top level means none of the literals are required.
+        if op == sre_parse.BRANCH:
+            return []
+
+    if current:
+        literals.append("".join(current).lower())
+    return literals
+
+
+class FileIndex:
+    """
+    In memory index of the entries below a set of roots, see module docs.
+
+    Entry ids index into the flat _names, _parents and _flags arrays. Deleted entries are flagged and skipped
+    until the index is compacted.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.RLock()
+        self._update_lock = threading.Lock()
+        self._loaded = False
+        self._dirty = False
+        self._readers = 0  # Searches running, entry ids must not be renumbered while they hold any.
+        self._reset()
+
+    def _reset(self):
+        self._names = []
+        self._parents = array('i')
+        self._flags = bytearray()
+        self._deleted = 0
+
+        self._roots = {}        # root path: entry id
+        self._dir_paths = {}    # entry id: path, for folders only
+        self._dir_ids = {}      # path: entry id, for folders only
+        self._dir_state = {}    # entry id: (mtime, array of child ids)
+        self._postings = {}     # trigram: array of entry ids
+
+    # Persistence
+    # ========================================
+    def load(self):
+        """
+        Load the index saved by save(), no folders are listed.
+        :return: True if an index was loaded.
+        """
+        self._loaded = True
+        if not os.path.exists(self._path):
+            return False
+
+        start = time.perf_counter()
+        try:
+            with open(self._path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as ex:
+            log.warning("Could not load file index {}: {}".format(self._path, ex))
+            return False
+
+        if data.get("version") != INDEX_FORMAT_VERSION:
+            log.info("File index format changed, it will be rebuilt.")
+            return False
+
+        with self._lock:
+            self._names = data["names"]
+            self._parents = data["parents"]
+            self._flags = data["flags"]
+            self._deleted = data["deleted"]
+            self._roots = data["roots"]
+            self._dir_paths = data["dir_paths"]
+            self._dir_ids = {v: k for k, v in self._dir_paths.items()}
+            self._dir_state = data["dir_state"]
+            self._postings = data["postings"]
+
+        log.debug("Loaded file index, {} entries in {:.3f}s".format(len(self._names), time.perf_counter() - start))
+        return True
+
+    def is_loaded(self):
+        return self._loaded
+
+    def is_dirty(self):
+        """
+        True if the index changed since it was loaded or saved.
+        """
+        return self._dirty
+
+    def updating(self):
+        """
+        Lock held while the index is being loaded or updated, only one update runs at a time.
+        Searches don't need it.
+        """
+        return self._update_lock
+
+    def save(self):
+        with self._lock:
+            # Compacting renumbers the entries, it waits for a save without searches running.
+            if self._readers == 0 and self._deleted > COMPACT_RATIO * max(1, len(self._names)):
+                self._compact()
+
+            data = {"version": INDEX_FORMAT_VERSION,
+                    "names": self._names,
+                    "parents": self._parents,
+                    "flags": self._flags,
+                    "deleted": self._deleted,
+                    "roots": self._roots,
+                    "dir_paths": self._dir_paths,
+                    "dir_state": self._dir_state,
+                    "postings": self._postings}
+
+            if not os.path.exists(os.path.dirname(self._path)):
+                os.makedirs(os.path.dirname(self._path))
+
+            temp_path = self._path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path)
+            self._dirty = False
+
+    # Queries
+    # ========================================
+    def roots(self):
+        return list(self._roots.keys())
+
+    def is_indexed(self, path: str):
+        return os.path.normpath(path).replace('\\', '/') in self._dir_ids
+
+    def entry_count(self):
+        return len(self._names) - self._deleted
+
+    def path(self, entry_id: int):
+        parent = self._parents[entry_id]
+        if parent < 0:
+            return self._names[entry_id]
+        return join_path(self._dir_paths[parent], self._names[entry_id])
+
+    def is_dir(self, entry_id: int):
+        return bool(self._flags[entry_id] & IS_DIR)
+
+    def candidates(self, search_string: str, regex=True):
+        """
+        Ids of the entries whose name contains all trigrams of the required literals of the search string.
+        :return: sorted list of ids, or None when the search string is too short to narrow anything down.
+        """
+        grams = set()
+        for literal in required_literals(search_string, regex):
+            grams |= trigrams(literal)
+        if not grams:
+            return None
+
+        with self._lock:
+            postings = []
+            for gram in grams:
+                posting = self._postings.get(gram)
+                if not posting:
+                    return []
+                postings.append(posting)
+
+            postings.sort(key=len)
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids.intersection_update(posting)
+                if not ids:
+                    break
+            return sorted(ids)
+
+    def search(self, pattern, search_string: str, regex=True, is_cancelled=None):
+        """
+        Yield (path, is_dir) of entries whose name matches the compiled pattern.
+        :param pattern: compiled regex the names are verified with.
+        :param search_string: the raw query, used for the trigram prefilter.
+        :param is_cancelled: callable, stop early when it returns True.
+        """
+        with self._lock:
+            self._readers += 1
+        try:
+            ids = self.candidates(search_string, regex)
+            if ids is None:
+                ids = range(len(self._names))
+
+            for count, entry_id in enumerate(ids):
+                if count % 4096 == 0 and is_cancelled and is_cancelled():
+                    return
+
+                if self._flags[entry_id] & DELETED:
+                    continue
+                if pattern.search(self._names[entry_id]) is None:
+                    continue
+
+                with self._lock:
+                    if self._flags[entry_id] & DELETED:
+                        continue
+                    result = self.path(entry_id), self.is_dir(entry_id)
+                yield result
+        finally:
+            with self._lock:
+                self._readers -= 1
+
+    def iter_entries(self, is_cancelled=None):
+        """
+        Yield (path, is_dir) of every entry, IE: for fuzzy matching where trigrams can't narrow anything down.
+        """
+        with self._lock:
+            self._readers += 1
+        try:
+            for entry_id in range(len(self._names)):
+                if entry_id % 4096 == 0 and is_cancelled and is_cancelled():
+                    return
+                if self._flags[entry_id] & DELETED:
+                    continue
+
+                with self._lock:
+                    if self._flags[entry_id] & DELETED:
+                        continue
+                    result = self.path(entry_id), self.is_dir(entry_id)
+                yield result
+        finally:
+            with self._lock:
+                self._readers -= 1
+
+    # Updates
+    # ========================================
+    def set_roots(self, roots, is_cancelled=None):
+        """
+        Index the given root folders. Roots that are already indexed are refreshed incrementally,
+        roots inside another root are skipped and roots that are no longer given are removed.
+        """
+        roots = sorted(set(os.path.normpath(r).replace('\\', '/') for r in roots if os.path.isdir(r)))
+        top_roots = []
+        for root in roots:
+            if not any(root.startswith(r.rstrip('/') + '/') for r in top_roots):
+                top_roots.append(root)
+
+        with self._lock:
+            for root in list(self._roots):
+                if root not in top_roots:
+                    self._delete_entry(self._roots.pop(root))
+
+            for root in top_roots:
+                if root not in self._roots:
+                    self._roots[root] = self._add_entry(root, -1, True)
+
+        for root in top_roots:
+            self.refresh_tree(self._roots[root], is_cancelled)
+
+    def refresh_tree(self, dir_id: int, is_cancelled=None):
+        """
+        Walk the tree below a folder, only folders whose mtime changed are listed again.
+        """
+        stack = [dir_id]
+        while stack:
+            if is_cancelled and is_cancelled():
+                return
+            stack.extend(self.refresh_directory(stack.pop()))
+
+    def update_directory(self, path: str):
+        """
+        Refresh a single indexed folder, IE: after a file system notification. New sub folders are indexed too.
+        """
+        dir_id = self._dir_ids.get(os.path.normpath(path).replace('\\', '/'))
+        if dir_id is None:
+            return
+
+        for sub_dir in self.refresh_directory(dir_id):
+            if sub_dir not in self._dir_state:
+                self.refresh_tree(sub_dir)
+
+    def refresh_directory(self, dir_id: int):
+        """
+        List a folder again if it changed since it was indexed.
+        :return: ids of its sub folders.
+        """
+        path = self._dir_paths.get(dir_id)
+        if path is None or self._flags[dir_id] & DELETED:
+            return []
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._delete_children(dir_id)
+            return []
+
+        state = self._dir_state.get(dir_id)
+        if state and state[0] == mtime:
+            return [c for c in state[1] if self._flags[c] == IS_DIR]
+
+        try:
+            with os.scandir(path) as it:
+                listing = []
+                for entry in it:
+                    try:
+                        listing.append((entry.name, entry.is_dir(follow_symlinks=False)))
+                    except OSError:
+                        continue
+        except OSError:
+            return []
+
+        with self._lock:
+            existing = {}
+            if state:
+                existing = {self._names[c]: c for c in state[1] if not self._flags[c] & DELETED}
+
+            children = array('I')
+            sub_dirs = []
+            complete = True
+            for name, is_dir in listing:
+                child = existing.pop(name, None)
+                if child is not None and self.is_dir(child) != is_dir:
+                    self._delete_entry(child)
+                    child = None
+
+                if child is None:
+                    # Full, entries already indexed are kept but no new ones are added.
+                    if len(self._names) - self._deleted >= MAX_INDEX_ENTRIES:
+                        if complete:
+                            log.warning("File index is full, {} is only partly indexed.".format(path))
+                        complete = False
+                        continue
+                    child = self._add_entry(name, dir_id, is_dir)
+
+                children.append(child)
+                if is_dir:
+                    sub_dirs.append(child)
+
+            for child in existing.values():
+                self._delete_entry(child)
+
+            # Without an mtime a partly indexed folder is listed again on the next refresh.
+            self._dir_state[dir_id] = (mtime if complete else None, children)
+            self._dirty = True
+        return sub_dirs
+
+    # Internal
+    # ========================================
+    def _add_entry(self, name, parent, is_dir):
+        self._dirty = True
+        entry_id = len(self._names)
+        self._names.append(name)
+        self._parents.append(parent)
+        self._flags.append(IS_DIR if is_dir else 0)
+
+        if is_dir:
+            path = name if parent < 0 else join_path(self._dir_paths[parent], name)
+            self._dir_paths[entry_id] = path
+            self._dir_ids[path] = entry_id
+
+        for gram in trigrams(name.lower()):
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array('I')
+            posting.append(entry_id)
+        return entry_id
+
+    def _delete_children(self, dir_id):
+        state = self._dir_state.pop(dir_id, None)
+        if state:
+            for child in state[1]:
+                self._delete_entry(child)
+
+    def _delete_entry(self, entry_id):
+        if self._flags[entry_id] & DELETED:
+            return
+
+        self._flags[entry_id] |= DELETED
+        self._deleted += 1
+        self._dirty = True
+        if self._flags[entry_id] & IS_DIR:
+            self._delete_children(entry_id)
+            path = self._dir_paths.pop(entry_id, None)
+            self._dir_ids.pop(path, None)
+
+    def _compact(self):
+        """
+        Drop deleted entries and renumber the rest.
+        """
+        log.debug("Compacting file index, {} of {} entries deleted".format(self._deleted, len(self._names)))
+        names, parents, flags = self._names, self._parents, self._flags
+        roots, dir_state = self._roots, self._dir_state
+        self._reset()
+
+        new_ids = {}
+        for old_id, name in enumerate(names):
+            if flags[old_id] & DELETED:
+                continue
+            parent = parents[old_id]
+            if parent >= 0:
+                parent = new_ids.get(parent)
+                if parent is None:
+                    continue
+            new_ids[old_id] = self._add_entry(name, parent, bool(flags[old_id] & IS_DIR))
+
+        self._roots = {root: new_ids[i] for root, i in roots.items() if i in new_ids}
+        for old_id, (mtime, children) in dir_state.items():
+            if old_id in new_ids:
+                self._dir_state[new_ids[old_id]] = (mtime, array('I', [new_ids[c] for c in children if c in new_ids]))
+
+
+class IndexSignals(QObject):
+    finished = Signal()
+
+
+class IndexUpdater(QtCore.QRunnable):
+    """
+    Loads the saved index if it has not been loaded yet, then indexes the given roots and/or refreshes
+    single directories and saves the result.
+    """
+
+    def __init__(self, roots=None, directories=None, index=None):
+        """
+        :param roots: All root folders to index, None keeps the current roots.
+        :param directories: Indexed folders to refresh, IE: folders that changed on disk.
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+        self.signals = IndexSignals()
+        self._roots = list(roots) if roots is not None else None
+        self._directories = list(directories or [])
+        self._index = index or file_index()
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def start(self):
+        QtCore.QThreadPool.globalInstance().start(self)
+
+    def run(self):
+        start = time.perf_counter()
+        with self._index.updating():
+            if not self._index.is_loaded():
+                self._index.load()
+
+            try:
+                if self._roots is not None:
+                    self._index.set_roots(self._roots, self.is_cancelled)
+                for directory in self._directories:
+                    self._index.update_directory(directory)
+                if not self._cancelled and self._index.is_dirty():
+                    self._index.save()
+            except Exception as ex:
+                log.error("File index update failed: {}".format(ex))
+
+        log.debug("File index updated, {} entries in {:.3f}s".format(self._index.entry_count(),
+                                                                      time.perf_counter() - start))
+        self.signals.finished.emit()
@@ -0,0 +1,289 @@
+"""
+Background directory listing.
+
+DirectoryLister walks a single directory with os.scandir on a worker thread and streams the entries back
+to the GUI thread in batches. The first batch is kept small so the first rows show up right away, later
+batches grow so large folders don't flood the event loop with signals.
+
+ListingCache keeps finished listings so going back, forward or up to a folder we just left does not hit the
+disk again. Entries are validated against the directory mtime on every lookup.
+
+Size, times and mode come from DirEntry.stat() of the same scandir pass. On Windows scandir already returned
+them, elsewhere it is one stat per entry, so they are only read when a view shows a column that needs them.
+"""
+
+from collections import namedtuple, OrderedDict
+import logging
+import os
+import sys
+import threading
+import time
+
+from PySide2 import QtCore
+from PySide2.QtCore import QObject, Signal
+
+from libs.tracing import span
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+FIRST_BATCH_SIZE = 64
+MAX_BATCH_SIZE = 4096
+BATCH_INTERVAL = 0.05  # Seconds, flush a partial batch after this long.
+
+MAX_LISTING_THREADS = 4
+
+# Listing cache limits
+LISTING_CACHE_MAX_ENTRIES = 64
+LISTING_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# What the lister knows about an entry, stat is a FileStat when the listing was made with stats.
+ListingEntry = namedtuple("ListingEntry", ["path", "is_dir", "stat"], defaults=(None,))
+# The stat fields the views show. ctime is the creation time where the platform keeps one.
+FileStat = namedtuple("FileStat", ["size", "mtime", "ctime", "mode"])
+MISSING_STAT = FileStat(None, None, None, None)
+
+_listing_pool = None
+_listing_cache = None
+
+
+def listing_pool():
+    """
+    Thread pool shared by all directory listings, created on first use.
+    """
+    global _listing_pool
+    if _listing_pool is None:
+        _listing_pool = QtCore.QThreadPool()
+        _listing_pool.setMaxThreadCount(MAX_LISTING_THREADS)
+    return _listing_pool
+
+
+def listing_cache():
+    """
+    Listing cache shared by all browsers, created on first use.
+    """
+    global _listing_cache
+    if _listing_cache is None:
+        _listing_cache = ListingCache()
+    return _listing_cache
+
+
+def file_stat(st: os.stat_result):
+    return FileStat(st.st_size, st.st_mtime, getattr(st, 'st_birthtime', st.st_ctime), st.st_mode)
+
+
+def scan_entry(entry: os.DirEntry, with_stat=False):
+    try:
+        is_dir = entry.is_dir()
+    except OSError:
+        is_dir = False
+
+    stat = None
+    if with_stat:
+        try:
+            stat = file_stat(entry.stat())
+        except OSError:
+            stat = MISSING_STAT
+    return ListingEntry(entry.path.replace('\\', '/'), is_dir, stat)
+
+
+class ListingSignals(QObject):
+    batch = Signal(int, object)     # listing id, [ListingEntry]
+    finished = Signal(int, bool)    # listing id, completed (False when cancelled or failed)
+    error = Signal(int, object)     # listing id, exception
+
+
+class DirectoryLister(QtCore.QRunnable):
+    """
+    Lists one directory, emitting ListingSignals tagged with listing_id so the receiver can drop
+    batches of a listing it has moved away from.
+    """
+
+    def __init__(self, path: str, listing_id: int, with_stat=False):
+        """
+        :param with_stat: Bool, fill in ListingEntry.stat.
+        """
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.signals = ListingSignals()
+        self._path = path
+        self._listing_id = listing_id
+        self._with_stat = with_stat
+        self._cancelled = False
+        self._mtime = None
+
+    def path(self):
+        return self._path
+
+    def listing_id(self):
+        return self._listing_id
+
+    def with_stat(self):
+        return self._with_stat
+
+    def mtime(self):
+        """
+        Directory mtime taken before the scan started, None until the listing has run.
+        """
+        return self._mtime
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def start(self):
+        listing_pool().start(self)
+
+    def run(self):
+        if self._cancelled:
+            self.signals.finished.emit(self._listing_id, False)
+            return
+
+        batch = []
+        batch_size = FIRST_BATCH_SIZE
+        last_flush = time.monotonic()
+
+        try:
+            with span("listing.scandir", "listing", path=self._path):
+                self._mtime = os.stat(self._path).st_mtime_ns
+                with os.scandir(self._path) as it:
+                    for entry in it:
+                        if self._cancelled:
+                            break
+
+                        batch.append(scan_entry(entry, self._with_stat))
+
+                        now = time.monotonic()
+                        if len(batch) >= batch_size or now - last_flush > BATCH_INTERVAL:
+                            self.signals.batch.emit(self._listing_id, batch)
+                            batch = []
+                            batch_size = min(batch_size * 2, MAX_BATCH_SIZE)
+                            last_flush = now
+
+        except OSError as ex:
+            log.warning("Could not list {}: {}".format(self._path, ex))
+            self.signals.error.emit(self._listing_id, ex)
+            self.signals.finished.emit(self._listing_id, False)
+            return
+
+        if self._cancelled:
+            self.signals.finished.emit(self._listing_id, False)
+            return
+
+        if batch:
+            self.signals.batch.emit(self._listing_id, batch)
+        self.signals.finished.emit(self._listing_id, True)
+
+
+class ListingCache:
+    """
+    LRU cache of directory listings keyed by the resolved directory path.
+
+    A cached listing is only returned while the directory mtime matches the one recorded before it was
+    listed, anything created, deleted or renamed in the directory invalidates it. Listings without stats
+    do not answer lookups that need them.
+    """
+
+    # Rough per entry cost of a ListingEntry and its list slot, on top of the path string.
+    ENTRY_OVERHEAD = 120
+    # Extra for its FileStat.
+    STAT_OVERHEAD = 180
+
+    def __init__(self, max_entries=LISTING_CACHE_MAX_ENTRIES, max_bytes=LISTING_CACHE_MAX_BYTES):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._listings = OrderedDict()  # key: (mtime, entries, size, with_stat)
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(path: str):
+        return os.path.normcase(os.path.realpath(path))
+
+    def get(self, path: str, with_stat=False):
+        """
+        :param with_stat: Bool, only return a listing that has stats.
+        :return: list of ListingEntry or None if the directory is not cached or has changed.
+        """
+        key = self.cache_key(path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            cached = self._listings.get(key)
+            if cached is None or mtime is None or cached[0] != mtime:
+                if cached is not None:
+                    self._discard(key)
+                self._misses += 1
+                return None
+
+            if with_stat and not cached[3]:
+                self._misses += 1
+                return None
+
+            self._listings.move_to_end(key)
+            self._hits += 1
+            return cached[1]
+
+    def store(self, path: str, mtime: int, entries: list, with_stat=False):
+        if mtime is None:
+            return
+
+        overhead = self.ENTRY_OVERHEAD + (self.STAT_OVERHEAD if with_stat else 0)
+        size = overhead * len(entries) + sum(sys.getsizeof(e.path) for e in entries)
+        if size > self._max_bytes:
+            return
+
+        key = self.cache_key(path)
+        with self._lock:
+            self._discard(key)
+            self._listings[key] = (mtime, list(entries), size, with_stat)
+            self._bytes += size
+            self._evict()
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._discard(self.cache_key(path))
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+            self._bytes = 0
+
+    def set_limits(self, max_entries=None, max_bytes=None):
+        with self._lock:
+            if max_entries is not None:
+                self._max_entries = max_entries
+            if max_bytes is not None:
+                self._max_bytes = max_bytes
+            self._evict()
+
+    def hits(self):
+        return self._hits
+
+    def misses(self):
+        return self._misses
+
+    def stats(self):
+        return {"hits": self._hits,
+                "misses": self._misses,
+                "listings": len(self._listings),
+                "bytes": self._bytes}
+
+    def _discard(self, key):
+        cached = self._listings.pop(key, None)
+        if cached is not None:
+            self._bytes -= cached[2]
+
+    def _evict(self):
+        while self._listings and (len(self._listings) > self._max_entries or self._bytes > self._max_bytes):
+            key, cached = self._listings.popitem(last=False)
+            self._bytes -= cached[2]
@@ -0,0 +1,377 @@
+"""
+Item models for the file browser views.
+
+FileTableModel reads names and paths from its FileItems and keeps only what the items don't have in flat
+arrays. It only answers for the cells a view asks about, so a QTableView only pays for the rows that are visible.
+Icons are looked up the same way, only for rows that get drawn, and filled in once IconCache resolves them.
+Size, date and permission cells are formatted from the item's stat values when drawn, hidden columns are
+never asked for.
+"""
+
+from array import array
+from bisect import bisect_left
+import logging
+import stat
+import time
+
+from PySide2 import QtCore, QtGui
+
+from libs.consts import *
+from libs.icons import icon_cache
+from libs.tracing import span
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+# Flags every row gets, extra per row flags (IE: editable pins) are stored in FileTableModel._flags
+BASE_ITEM_FLAGS = QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled | \
+                  QtCore.Qt.ItemIsDropEnabled
+
+SIZE_UNITS = ("B", "KB", "MB", "GB", "TB", "PB")
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+def format_size(size):
+    """
+    :param size: int bytes or None
+    :return: str, IE: "1.4 MB"
+    """
+    if size is None:
+        return ""
+    value = float(size)
+    for unit in SIZE_UNITS:
+        if value < 1024 or unit == SIZE_UNITS[-1]:
+            break
+        value /= 1024
+    if unit == SIZE_UNITS[0]:
+        return "{} {}".format(size, unit)
+    return "{:.1f} {}".format(value, unit)
+
+
+def format_time(timestamp):
+    if timestamp is None:
+        return ""
+    return time.strftime(TIME_FORMAT, time.localtime(timestamp))
+
+
+def format_mode(mode):
+    if mode is None:
+        return ""
+    return stat.filemode(mode)
+
+
+# Display keys whose FileItem values are not shown as they are.
+CELL_FORMATTERS = {
+    FILE_SIZE: format_size,
+    DATE_MODIFIED: format_time,
+    DATE_CREATED: format_time,
+    PERMISSIONS: format_mode,
+}
+RIGHT_ALIGNED_KEYS = (FILE_SIZE,)
+
+
+class FileTableModel(QtCore.QAbstractTableModel):
+    """
+    Columnar model of FileItems.
+
+    Cell text comes from the items, which already hold their names and paths. Colors are held as an index
+    into a shared color table and item flags in unsigned int arrays, one entry per row. The FileItem of a row
+    is available through FILE_ITEM_DATA_ROLE.
+    """
+
+    def __init__(self, display_keys: list, parent=None):
+        super().__init__(parent)
+        self._display_keys = list(display_keys)
+
+        # Column arrays, one entry per row.
+        self._items = []
+        self._colors = array('I')
+        self._flags = array('I')
+
+        # Shared colors, many rows use the same one.
+        self._color_table = []
+        self._color_lookup = {}
+
+        # Rows drawn with a placeholder icon, key: icon key they are waiting on.
+        self._icon_rows = {}
+        icon_cache().icon_ready.connect(self.icon_ready)
+
+    # Qt Model Interface
+    # ========================================
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._items)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._display_keys)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        if role == QtCore.Qt.DisplayRole or role == QtCore.Qt.EditRole:
+            return self._cell_text(row, self._display_keys[index.column()])
+
+        if role == QtCore.Qt.DecorationRole:
+            if index.column() == 0:
+                icon, pending_key = icon_cache().icon_or_request(self._items[row])
+                if pending_key is not None:
+                    self._icon_rows.setdefault(pending_key, set()).add(row)
+                return icon
+            return None
+
+        if role == QtCore.Qt.BackgroundRole:
+            return self._color_table[self._colors[row]]
+
+        if role == QtCore.Qt.ToolTipRole:
+            if self._display_keys[index.column()] == FILE_SIZE:
+                count = self._items[row].file_count()
+                if count is not None:
+                    return "{:,} files".format(count)
+            return None
+
+        if role == QtCore.Qt.TextAlignmentRole:
+            if self._display_keys[index.column()] in RIGHT_ALIGNED_KEYS:
+                return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+            return None
+
+        if role == FILE_ITEM_DATA_ROLE:
+            return self._items[row]
+
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        """
+        Renaming a pin only changes the name it is displayed with, never the file on disk.
+        """
+        if not index.isValid() or role != QtCore.Qt.EditRole:
+            return False
+
+        if self._display_keys[index.column()] != FILE_NAME or not value:
+            return False
+
+        self._items[index.row()].set_nice_name(value)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.ItemIsDropEnabled
+        return BASE_ITEM_FLAGS | QtCore.Qt.ItemFlags(self._flags[index.row()])
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            if section < len(self._display_keys):
+                return self._display_keys[section]
+        return None
+
+    def supportedDropActions(self):
+        return QtCore.Qt.CopyAction | QtCore.Qt.MoveAction
+
+    def mimeTypes(self):
+        return [FILE_ITEM_MIME_TYPE, "text/uri-list"]
+
+    def mimeData(self, indexes):
+        """
+        The FileItems themselves travel through the module level drop message, the mime data only
+        carries the paths so items can also be dragged out of the application.
+        """
+        rows = sorted(set(i.row() for i in indexes if i.isValid()))
+        paths = [self._items[r].file_path() for r in rows]
+
+        mime_data = QtCore.QMimeData()
+        mime_data.setData(FILE_ITEM_MIME_TYPE, QtCore.QByteArray("\n".join(paths).encode('utf-8')))
+        mime_data.setUrls([QtCore.QUrl.fromLocalFile(p) for p in paths])
+        return mime_data
+
+    def icon_ready(self, key):
+        rows = self._icon_rows.pop(key, None)
+        if not rows:
+            return
+
+        last_row = len(self._items) - 1
+        rows = [r for r in rows if r <= last_row]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), 0), [QtCore.Qt.DecorationRole])
+
+    # Item Access
+    # ========================================
+    def display_keys(self):
+        return self._display_keys
+
+    def items(self):
+        return self._items
+
+    def paths(self):
+        return [item.file_path() for item in self._items]
+
+    def item(self, row: int):
+        if 0 <= row < len(self._items):
+            return self._items[row]
+        return None
+
+    def row_of(self, item):
+        try:
+            return self._items.index(item)
+        except ValueError:
+            return -1
+
+    # Editing
+    # ========================================
+    def clear(self):
+        self.beginResetModel()
+        self._icon_rows = {}
+        self._items = []
+        self._colors = array('I')
+        self._flags = array('I')
+        self.endResetModel()
+
+    def add_item(self, item):
+        self.add_items([item])
+
+    def add_items(self, items):
+        """
+        Append items with a single row insert.
+        :param items: list of FileItems
+        """
+        if not items:
+            return
+
+        first = len(self._items)
+        with span("model.add_items", "model", rows=len(items)):
+            self.beginInsertRows(QtCore.QModelIndex(), first, first + len(items) - 1)
+            for item in items:
+                self._append_row(item)
+            self.endInsertRows()
+
+    def remove_rows(self, rows):
+        """
+        Remove rows, contiguous runs are removed together starting from the bottom.
+        :param rows: iterable of row numbers
+        """
+        rows = sorted(set(rows), reverse=True)
+        if not rows:
+            return
+
+        # Rows waiting on an icon move up by the number of removed rows above them.
+        removed = rows[::-1]
+        removed_set = set(rows)
+        icon_rows = {}
+        for key, waiting in self._icon_rows.items():
+            waiting = set(r - bisect_left(removed, r) for r in waiting if r not in removed_set)
+            if waiting:
+                icon_rows[key] = waiting
+        self._icon_rows = icon_rows
+
+        while rows:
+            last = rows.pop(0)
+            first = last
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self._items[first:last + 1]
+            del self._colors[first:last + 1]
+            del self._flags[first:last + 1]
+            self.endRemoveRows()
+
+    def reorder(self, order):
+        """
+        Move rows into a new order, selections and the current row follow their items.
+        :param order: list of the current row numbers in their new order.
+        """
+        if len(order) != len(self._items):
+            raise ValueError("Order has {} rows, the model {}".format(len(order), len(self._items)))
+
+        self.layoutAboutToBeChanged.emit()
+        self._items = [self._items[r] for r in order]
+        self._colors = array('I', (self._colors[r] for r in order))
+        self._flags = array('I', (self._flags[r] for r in order))
+
+        new_rows = [0] * len(order)
+        for new_row, old_row in enumerate(order):
+            new_rows[old_row] = new_row
+        self._icon_rows = {k: set(new_rows[r] for r in rows if r < len(new_rows))
+                           for k, rows in self._icon_rows.items()}
+
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(new_rows[i.row()], i.column()) for i in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def refresh_row(self, row: int):
+        """
+        Re-read the column values of a row from its FileItem, IE: after the color has changed.
+        """
+        self.refresh_rows([row])
+
+    def refresh_rows(self, rows):
+        """
+        Re-read the column values of rows, one dataChanged for the range they span.
+        :param rows: list of row numbers
+        """
+        if not rows:
+            return
+
+        for row in rows:
+            self._colors[row] = self._color_index(self._items[row].color())
+        self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), self.columnCount() - 1))
+
+    def column_changed(self, key: str):
+        """
+        Values of a column changed for any number of rows, IE: folder sizes came in. Views only repaint
+        the part that is visible.
+        """
+        if key not in self._display_keys or not self._items:
+            return
+        column = self._display_keys.index(key)
+        self.dataChanged.emit(self.index(0, column), self.index(len(self._items) - 1, column),
+                              [QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole])
+
+    def set_row_flags(self, row: int, flags):
+        self._flags[row] = int(flags)
+
+    def row_flags(self, row: int):
+        return QtCore.Qt.ItemFlags(self._flags[row])
+
+    # Internal
+    # ========================================
+    def _append_row(self, item):
+        self._items.append(item)
+        self._colors.append(self._color_index(item.color()))
+        self._flags.append(0)
+
+    def _cell_text(self, row, key):
+        item = self._items[row]
+        if key == FILE_NAME:
+            return item.nice_name()
+        if key == FILE_PATH:
+            return item.file_path()
+
+        if hasattr(item, key):
+            value = getattr(item, key)()
+            formatter = CELL_FORMATTERS.get(key)
+            return formatter(value) if formatter else str(value)
+        return "NO DATA {}".format(key)
+
+    def _color_index(self, color):
+        if isinstance(color, QtGui.QColor):
+            color = color.getRgbF()
+        key = tuple(color) if color else None
+
+        idx = self._color_lookup.get(key)
+        if idx is None:
+            if key:
+                q_color = QtGui.QColor()
+                q_color.setRgbF(*key)
+            else:
+                q_color = None
+            idx = len(self._color_table)
+            self._color_table.append(q_color)
+            self._color_lookup[key] = idx
+        return idx
@@ -0,0 +1,430 @@
+"""
+Saved pin lists and browsers.
+
+DataStore keeps the saved state in memory and writes every change to an append-only journal next to the
+snapshot, browser_data.json. Journal lines are handed to a writer thread about once a second, so a crash
+loses at most the last second and closing only has to flush what is still pending. Every so often the
+writer compacts the journal into a new snapshot. Snapshots are written to a temp file and renamed over the
+old one, so there is always a complete snapshot on disk.
+
+Every journal line carries a sequence number and a snapshot records the last sequence number it includes,
+loading replays the journal lines after it. A torn last line from a crash is skipped. A snapshot that can not
+be read is moved aside with a copy of the journal and never compacted over, the journal keeps every change.
+
+Pin dicts are never changed in place once they are handed to the store, changes replace them. This lets
+the writer thread serialize a snapshot while the GUI thread carries on.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import shutil
+import time
+
+from PySide2 import QtCore
+
+from libs.tracing import traced
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+DATA_FORMAT = "file-browser-data"
+DATA_FORMAT_VERSION = 2
+
+JOURNAL_FLUSH_INTERVAL = 1000  # ms
+COMPACT_JOURNAL_OPS = 2000
+COMPACT_JOURNAL_BYTES = 4 * 1024 * 1024
+
+# Save Data keys
+FORMAT = "format"
+FORMAT_VERSION = "version"
+SEQUENCE = "seq"
+BROWSERS = "browsers"
+PIN_LISTS = "pin_lists"
+LIST_ID = "id"
+FAV_WIDGET_NAME = "fav_widget_name"
+FAV_WIDGET_PINS = 'fav_widget_pins'
+
+# Journal ops
+OP = "op"
+ADD_LIST = "add_list"
+REMOVE_LIST = "remove_list"
+RENAME_LIST = "rename_list"
+ADD_PINS = "add_pins"
+REMOVE_PINS = "remove_pins"
+UPDATE_PINS = "update_pins"
+SET_PINS = "set_pins"
+SET_BROWSERS = "set_browsers"
+
+
+def empty_state():
+    return {PIN_LISTS: [], BROWSERS: {}}
+
+
+def find_list(state: dict, list_id: int):
+    for pin_list in state[PIN_LISTS]:
+        if pin_list[LIST_ID] == list_id:
+            return pin_list
+    return None
+
+
+def apply_op(state: dict, op: dict):
+    """
+    Apply a journal op to the state, used for live changes and for replaying the journal.
+    """
+    kind = op[OP]
+    if kind == SET_BROWSERS:
+        state[BROWSERS] = op[BROWSERS]
+        return
+
+    if kind == ADD_LIST:
+        state[PIN_LISTS].append({LIST_ID: op[LIST_ID], FAV_WIDGET_NAME: op[FAV_WIDGET_NAME],
+                                 FAV_WIDGET_PINS: list(op.get(FAV_WIDGET_PINS, []))})
+        return
+
+    pin_list = find_list(state, op[LIST_ID])
+    if pin_list is None:
+        log.warning("Journal op {} for unknown pin list {}".format(kind, op[LIST_ID]))
+        return
+
+    pins = pin_list[FAV_WIDGET_PINS]
+    if kind == REMOVE_LIST:
+        state[PIN_LISTS].remove(pin_list)
+    elif kind == RENAME_LIST:
+        pin_list[FAV_WIDGET_NAME] = op[FAV_WIDGET_NAME]
+    elif kind == ADD_PINS:
+        pins[op["row"]:op["row"]] = op[FAV_WIDGET_PINS]
+    elif kind == REMOVE_PINS:
+        del pins[op["first"]:op["last"] + 1]
+    elif kind == UPDATE_PINS:
+        pins[op["row"]:op["row"] + len(op[FAV_WIDGET_PINS])] = op[FAV_WIDGET_PINS]
+    elif kind == SET_PINS:
+        pin_list[FAV_WIDGET_PINS] = list(op[FAV_WIDGET_PINS])
+    else:
+        log.warning("Unknown journal op {}".format(kind))
+
+
+def upgrade_snapshot(data: dict):
+    """
+    :return: state from any snapshot version, the first version had no version key and no list ids.
+    """
+    state = empty_state()
+    state[BROWSERS] = data.get(BROWSERS) or {}
+    for num, pin_list in enumerate(data.get(PIN_LISTS) or []):
+        state[PIN_LISTS].append({LIST_ID: pin_list.get(LIST_ID, num),
+                                 FAV_WIDGET_NAME: pin_list.get(FAV_WIDGET_NAME, ""),
+                                 FAV_WIDGET_PINS: pin_list.get(FAV_WIDGET_PINS) or []})
+    return state
+
+
+def ensure_directory(path: str):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+
+def write_atomic(path: str, text: str):
+    """
+    Write to a temp file and rename it over path, readers see the old or the new file, never half of one.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class DataStore(QtCore.QObject):
+    """
+    Journaled store of the pin lists and browsers.
+
+        store = DataStore(path)
+        for pin_list in store.load():
+            ...
+        store.track_list(list_id, fav_widget.model())  # Model changes are journaled from now on.
+        store.close()
+    """
+
+    def __init__(self, path: str, parent=None):
+        """
+        :param path: snapshot path, the journal is written next to it.
+        """
+        super().__init__(parent)
+        self._path = path
+        self._journal_path = os.path.splitext(path)[0] + ".journal"
+
+        self._state = empty_state()
+        self._loaded = False
+        self._snapshot_ok = True  # False when the snapshot could not be read, it is not compacted over then.
+        self._seq = 0
+        self._next_list_id = 0
+
+        self._pending = []  # Journal lines not handed to the writer yet.
+        self._journal_ops = 0
+        self._journal_bytes = 0
+        self._tracked = {}  # list id: (model, [(signal, slot)])
+
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="data-store")
+        self._flush_timer = QtCore.QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(JOURNAL_FLUSH_INTERVAL)
+        self._flush_timer.timeout.connect(self.flush)
+
+    def path(self):
+        return self._path
+
+    def journal_path(self):
+        return self._journal_path
+
+    def is_loaded(self):
+        return self._loaded
+
+    # Loading
+    # ========================================
+    @traced("persistence.load", "persistence")
+    def load(self):
+        """
+        Read the snapshot and replay the journal.
+        :return: [{LIST_ID, FAV_WIDGET_NAME, FAV_WIDGET_PINS}] pin lists, do not change them.
+        """
+        snapshot_seq = 0
+        upgraded = False
+        if os.path.exists(self._path):
+            try:
+                with open(self._path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get(FORMAT_VERSION, 1) > DATA_FORMAT_VERSION:
+                    log.warning("{} was saved by a newer version".format(self._path))
+                self._state = upgrade_snapshot(data)
+                upgraded = data.get(FORMAT_VERSION) != DATA_FORMAT_VERSION
+                snapshot_seq = data.get(SEQUENCE, 0)
+            except (OSError, ValueError) as ex:
+                log.error("Could not load {}: {}".format(self._path, ex))
+                self._snapshot_ok = False
+                self.move_aside_corrupt()
+
+        self._seq = snapshot_seq
+        replayed = self.replay_journal(snapshot_seq)
+
+        self._next_list_id = max([l[LIST_ID] for l in self._state[PIN_LISTS]] + [-1]) + 1
+        self._loaded = True
+
+        # Fold what the journal had into a new snapshot, or write the first versioned snapshot.
+        if replayed or upgraded or not os.path.exists(self._path) or self._journal_bytes:
+            self.compact()
+
+        return self._state[PIN_LISTS]
+
+    def move_aside_corrupt(self):
+        """
+        Keep an unreadable snapshot and the journal as <name>.corrupt-<time> so the pins can be recovered by hand.
+        """
+        suffix = ".corrupt-{}".format(time.strftime("%Y%m%d-%H%M%S"))
+        try:
+            if os.path.exists(self._journal_path):
+                shutil.copy2(self._journal_path, self._journal_path + suffix)
+            os.replace(self._path, self._path + suffix)
+            log.warning("Moved unreadable {} to {}".format(self._path, self._path + suffix))
+        except OSError as ex:
+            log.error("Could not move aside {}: {}".format(self._path, ex))
+
+    def replay_journal(self, snapshot_seq: int):
+        """
+        :return: number of ops applied.
+        """
+        if not os.path.exists(self._journal_path):
+            return 0
+
+        replayed = 0
+        try:
+            with open(self._journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._journal_bytes += len(line)
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        log.warning("Skipping torn journal line in {}".format(self._journal_path))
+                        break
+
+                    if OP not in op:
+                        if op.get(FORMAT_VERSION, 1) > DATA_FORMAT_VERSION:
+                            log.warning("{} was written by a newer version".format(self._journal_path))
+                        continue
+                    if op[SEQUENCE] <= snapshot_seq:
+                        continue
+
+                    apply_op(self._state, op)
+                    self._seq = op[SEQUENCE]
+                    replayed += 1
+        except OSError as ex:
+            log.error("Could not read {}: {}".format(self._journal_path, ex))
+
+        log.debug("Replayed {} journal ops".format(replayed))
+        return replayed
+
+    def pin_lists(self):
+        return self._state[PIN_LISTS]
+
+    def browsers(self):
+        return self._state[BROWSERS]
+
+    # Changes
+    # ========================================
+    def record(self, op: dict):
+        self._seq += 1
+        op[SEQUENCE] = self._seq
+        apply_op(self._state, op)
+
+        self._pending.append(json.dumps(op) + "\n")
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def add_list(self, name: str, pins=None):
+        """
+        :return: id of the new list.
+        """
+        list_id = self._next_list_id
+        self._next_list_id += 1
+        self.record({OP: ADD_LIST, LIST_ID: list_id, FAV_WIDGET_NAME: name, FAV_WIDGET_PINS: list(pins or [])})
+        return list_id
+
+    def remove_list(self, list_id: int):
+        self.untrack_list(list_id)
+        self.record({OP: REMOVE_LIST, LIST_ID: list_id})
+
+    def rename_list(self, list_id: int, name: str):
+        self.record({OP: RENAME_LIST, LIST_ID: list_id, FAV_WIDGET_NAME: name})
+
+    def add_pins(self, list_id: int, row: int, pins: list):
+        self.record({OP: ADD_PINS, LIST_ID: list_id, "row": row, FAV_WIDGET_PINS: pins})
+
+    def remove_pins(self, list_id: int, first: int, last: int):
+        self.record({OP: REMOVE_PINS, LIST_ID: list_id, "first": first, "last": last})
+
+    def update_pins(self, list_id: int, row: int, pins: list):
+        self.record({OP: UPDATE_PINS, LIST_ID: list_id, "row": row, FAV_WIDGET_PINS: pins})
+
+    def set_pins(self, list_id: int, pins: list):
+        self.record({OP: SET_PINS, LIST_ID: list_id, FAV_WIDGET_PINS: pins})
+
+    def set_browsers(self, browsers: dict):
+        if browsers != self._state[BROWSERS]:
+            self.record({OP: SET_BROWSERS, BROWSERS: browsers})
+
+    # Model Tracking
+    # ========================================
+    def track_list(self, list_id: int, model):
+        """
+        Journal the row changes of a FileTableModel showing the pin list.
+        """
+        self.untrack_list(list_id)
+
+        def serialize_rows(first, last):
+            return [model.item(row).toJSON() for row in range(first, last + 1)]
+
+        def data_changed(top_left, bottom_right, roles=()):
+            if roles and all(r == QtCore.Qt.DecorationRole for r in roles):
+                return  # Icons finished loading, nothing to save.
+            self.update_pins(list_id, top_left.row(), serialize_rows(top_left.row(), bottom_right.row()))
+
+        def reset():
+            self.set_pins(list_id, [i.toJSON() for i in model.items()])
+
+        connections = [
+            (model.rowsInserted, lambda parent, first, last: self.add_pins(list_id, first,
+                                                                            serialize_rows(first, last))),
+            (model.rowsRemoved, lambda parent, first, last: self.remove_pins(list_id, first, last)),
+            (model.dataChanged, data_changed),
+            (model.modelReset, reset),
+            (model.layoutChanged, reset),
+        ]
+        for signal, slot in connections:
+            signal.connect(slot)
+        self._tracked[list_id] = (model, connections)
+
+    def untrack_list(self, list_id: int):
+        model, connections = self._tracked.pop(list_id, (None, []))
+        for signal, slot in connections:
+            try:
+                signal.disconnect(slot)
+            except (RuntimeError, TypeError):
+                pass  # Model already deleted.
+
+    # Writing
+    # ========================================
+    @traced("persistence.flush", "persistence")
+    def flush(self):
+        """
+        Hand pending journal lines to the writer thread, compact the journal when it got long.
+        """
+        self._flush_timer.stop()
+        if self._pending:
+            lines, self._pending = self._pending, []
+            self._journal_ops += len(lines)
+            self._journal_bytes += sum(len(l) for l in lines)
+            self._writer.submit(self._append_journal, lines)
+
+        if self._journal_ops > COMPACT_JOURNAL_OPS or self._journal_bytes > COMPACT_JOURNAL_BYTES:
+            self.compact()
+
+    @traced("persistence.compact", "persistence")
+    def compact(self):
+        """
+        Write a snapshot of the current state on the writer thread and empty the journal.
+        """
+        if self._pending:
+            lines, self._pending = self._pending, []
+            self._writer.submit(self._append_journal, lines)
+
+        if not self._snapshot_ok:
+            return  # The state is missing what the unreadable snapshot held, only the journal is complete.
+
+        # Copy the structure, the pin dicts are shared but never changed in place.
+        snapshot = {FORMAT: DATA_FORMAT,
+                    FORMAT_VERSION: DATA_FORMAT_VERSION,
+                    SEQUENCE: self._seq,
+                    BROWSERS: self._state[BROWSERS],
+                    PIN_LISTS: [{LIST_ID: l[LIST_ID],
+                                 FAV_WIDGET_NAME: l[FAV_WIDGET_NAME],
+                                 FAV_WIDGET_PINS: list(l[FAV_WIDGET_PINS])} for l in self._state[PIN_LISTS]]}
+        self._journal_ops = 0
+        self._journal_bytes = 0
+        self._writer.submit(self._write_snapshot, snapshot)
+
+    def close(self):
+        """
+        Write what is pending and wait for the writer, only the journal tail is left to write.
+        """
+        self.flush()
+        self._writer.shutdown(wait=True)
+        for list_id in list(self._tracked):
+            self.untrack_list(list_id)
+
+    @traced("persistence.append_journal", "persistence")
+    def _append_journal(self, lines: list):
+        try:
+            ensure_directory(self._journal_path)
+            new_journal = not os.path.exists(self._journal_path)
+            with open(self._journal_path, 'a', encoding='utf-8') as f:
+                if new_journal:
+                    f.write(json.dumps({FORMAT: DATA_FORMAT, FORMAT_VERSION: DATA_FORMAT_VERSION}) + "\n")
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as ex:
+            log.error("Could not write {}: {}".format(self._journal_path, ex))
+
+    @traced("persistence.write_snapshot", "persistence")
+    def _write_snapshot(self, snapshot: dict):
+        try:
+            ensure_directory(self._path)
+            write_atomic(self._path, json.dumps(snapshot))
+            # Everything journaled so far is in the snapshot, later lines are queued behind us.
+            if os.path.exists(self._journal_path):
+                os.remove(self._journal_path)
+            log.debug("Saved {}".format(self._path))
+        except OSError as ex:
+            log.error("Could not save {}: {}".format(self._path, ex))
@@ -0,0 +1,182 @@
+"""
+Search result sink.
+
+The search thread emits matches in chunks, during a big search that can be thousands of matches per chunk
+and many chunks per frame. ResultSink queues whatever arrives and appends it to the results view once per
+frame, one model insert per batch. Batch sizes follow the measured insert speed so a frame is never spent
+inserting rows, the rest of a large burst goes in over the next frames.
+"""
+
+import logging
+import time
+
+from PySide2 import QtCore
+from PySide2.QtCore import Signal
+
+from libs.tracing import traced
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+RESULT_FRAME_INTERVAL = 16  # ms, flush at most once per frame at 60fps.
+RESULT_FRAME_BUDGET = 0.006  # Seconds of each frame that can be spent inserting rows.
+FIRST_RESULT_BATCH = 256
+MIN_RESULT_BATCH = 64
+MAX_RESULT_BATCH = 8192
+
+
+class ResultSink(QtCore.QObject):
+    """
+    Streams search results into a view with clear() and add_items(items), IE: a FileTableWidget.
+
+        sink = ResultSink(view)
+        sink.status_changed.connect(label.setText)
+        sink.start()
+        sink.add(items)  # As often as results arrive.
+        sink.finish()
+    """
+    status_changed = Signal(str)
+
+    def __init__(self, view=None, parent=None):
+        super().__init__(parent)
+        self._view = view
+
+        self._pending = []
+        self._ranked = None
+        self._batch_size = FIRST_RESULT_BATCH
+
+        self._count = 0
+        self._progress = 0
+        self._start_time = None
+        self._finished = False
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(RESULT_FRAME_INTERVAL)
+        self._timer.timeout.connect(self.flush)
+
+    def view(self):
+        return self._view
+
+    def set_view(self, view):
+        self._view = view
+
+    def count(self):
+        """
+        Results shown in the view.
+        """
+        return self._count
+
+    def pending_count(self):
+        return len(self._pending) if self._ranked is None else len(self._ranked)
+
+    def start(self):
+        """
+        Clear the view for a new search.
+        """
+        self._timer.stop()
+        self._pending = []
+        self._ranked = None
+        self._batch_size = FIRST_RESULT_BATCH
+        self._count = 0
+        self._progress = 0
+        self._start_time = time.monotonic()
+        self._finished = False
+        if self._view:
+            self._view.clear()
+        self.update_status()
+
+    def add(self, items: list):
+        """
+        Queue results, they are added to the view with the next frame.
+        """
+        if not items:
+            return
+        self._pending.extend(items)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def replace(self, items: list):
+        """
+        Show items instead of the current results, IE: a new ranking. Only the latest ranking that
+        arrives within a frame is shown.
+        """
+        self._pending = []
+        self._ranked = list(items)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def set_progress(self, progress: int):
+        self._progress = progress
+        self.update_status()
+
+    def finish(self):
+        """
+        The search is done, queued results still go in over the next frames.
+        """
+        self._finished = True
+        self._progress = 100
+        if not self._timer.isActive():
+            self.update_status()
+
+    def cancel(self):
+        """
+        Drop queued results, the results shown so far stay.
+        """
+        self._timer.stop()
+        self._pending = []
+        self._ranked = None
+        self._start_time = None
+        self._finished = False
+
+    @traced("results.flush", "search")
+    def flush(self):
+        if not self._view:
+            self._timer.stop()
+            return
+
+        start = time.perf_counter()
+        if self._ranked is not None:
+            ranked, self._ranked = self._ranked, None
+            self._view.clear()
+            self._view.add_items(ranked)
+            self._count = len(ranked)
+        elif self._pending:
+            batch = self._pending[:self._batch_size]
+            del self._pending[:self._batch_size]
+            self._view.add_items(batch)
+            self._count += len(batch)
+            self.fit_batch_size(len(batch), time.perf_counter() - start)
+
+        if not self._pending and self._ranked is None:
+            self._timer.stop()
+        self.update_status()
+
+    def fit_batch_size(self, inserted: int, seconds: float):
+        """
+        Size the next batch so that inserting it takes about RESULT_FRAME_BUDGET.
+        """
+        if inserted < self._batch_size:
+            return  # The queue ran dry, nothing learned about the limit.
+        if seconds <= 0:
+            self._batch_size = min(MAX_RESULT_BATCH, self._batch_size * 2)
+            return
+        fitted = int(inserted * RESULT_FRAME_BUDGET / seconds)
+        self._batch_size = max(MIN_RESULT_BATCH, min(MAX_RESULT_BATCH, fitted))
+
+    def status(self):
+        """
+        :return: str, IE: "12,345 hits  48,210/s  62%" while searching, "12,345 hits in 0.26s" when done.
+        """
+        if self._start_time is None:
+            return "{:,} hits".format(self._count)
+
+        elapsed = time.monotonic() - self._start_time
+        if self._finished and not self._pending and self._ranked is None:
+            return "{:,} hits in {:.2f}s".format(self._count, elapsed)
+
+        rate = self._count / elapsed if elapsed > 0 else 0
+        return "{:,} hits  {:,.0f}/s  {}%".format(self._count, rate, self._progress)
+
+    def update_status(self):
+        self.status_changed.emit(self.status())
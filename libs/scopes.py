@@ -0,0 +1,124 @@
+"""
+Search scopes.
+
+Each search mode searches the items of a group of views: every browser and pin list, the current pin list
+or the active browser. A CandidateSet keeps the items of its group ready for the search thread. It listens
+to the models of its views and only rebuilds its item list, and bumps its key, when one of them changed.
+Searching an unchanged scope costs nothing on the GUI thread and lets the search thread keep refining.
+"""
+
+import itertools
+import logging
+
+from PySide2 import QtCore
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+_set_ids = itertools.count()
+
+MODEL_CHANGE_SIGNALS = ("rowsInserted", "rowsRemoved", "modelReset", "layoutChanged")
+# Roles whose changes never change what a search matches, IE: icons that finished loading.
+IGNORED_CHANGE_ROLES = (QtCore.Qt.DecorationRole,)
+
+
+class CandidateSet(QtCore.QObject):
+    """
+    Items of a group of sources, a source is anything with get_items(), IE: a BrowserWidget or FavWidget.
+
+        scope = CandidateSet()
+        scope.add_source(fav_widget, [fav_widget.model()])
+        items, key = scope.items(), scope.key()
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._id = next(_set_ids)
+        self._sources = {}  # source: [models it is shown in]
+        self._items = []
+        self._version = 0
+        self._dirty = True
+
+    def sources(self):
+        return list(self._sources)
+
+    def add_source(self, source, models):
+        """
+        :param source: object with get_items()
+        :param models: models whose row changes change source.get_items()
+        """
+        if source in self._sources:
+            return
+
+        self._sources[source] = list(models)
+        for model in models:
+            for name in MODEL_CHANGE_SIGNALS:
+                getattr(model, name).connect(self.invalidate)
+            model.dataChanged.connect(self.data_changed)
+        self.invalidate()
+
+    def remove_source(self, source):
+        models = self._sources.pop(source, None)
+        if models is None:
+            return
+
+        for model in models:
+            for name in MODEL_CHANGE_SIGNALS:
+                try:
+                    getattr(model, name).disconnect(self.invalidate)
+                except (RuntimeError, TypeError):
+                    pass  # Model already deleted.
+            try:
+                model.dataChanged.disconnect(self.data_changed)
+            except (RuntimeError, TypeError):
+                pass
+        self.invalidate()
+
+    def set_sources(self, sources):
+        """
+        :param sources: [(source, models)]
+        """
+        sources = [(s, m) for s, m in sources if s is not None]
+        if [s for s, _ in sources] == list(self._sources):
+            return
+
+        for source in list(self._sources):
+            self.remove_source(source)
+        for source, models in sources:
+            self.add_source(source, models)
+
+    def clear(self):
+        self.set_sources([])
+
+    def invalidate(self, *args):
+        self._dirty = True
+
+    def data_changed(self, top_left, bottom_right, roles=()):
+        """
+        Items changed in place, IE: a renamed pin now matches other searches.
+        """
+        if roles and all(r in IGNORED_CHANGE_ROLES for r in roles):
+            return
+        self.invalidate()
+
+    def items(self):
+        """
+        :return: list of FileItems of all sources, rebuilt only when a source changed since the last call.
+        The list is not changed afterwards, it can be handed to the search thread.
+        """
+        if self._dirty:
+            items = []
+            for source in self._sources:
+                items.extend(source.get_items())
+            self._items = items
+            self._version += 1
+            self._dirty = False
+        return self._items
+
+    def key(self):
+        """
+        :return: (set id, version), changes whenever items() changes.
+        """
+        self.items()
+        return self._id, self._version
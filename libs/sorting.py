@@ -0,0 +1,182 @@
+"""
+Pin list sorting.
+
+PinSorter works out a sort key per item once and keeps it until the item changes, re-sorting a list
+only sorts the cached keys. Usage changes with every open, its cached part is the item's access key and the
+rank is looked up in the access store on each sort. Size and date keys use the item's stat, items without one
+are stat'ed by a StatJob first so the GUI thread never waits on a slow drive:
+
+    items = sorter.needs_stat(items, SORT_SIZE)
+    if items:
+        job = StatJob(job_id, [i.file_path() for i in items])
+        job.signals.finished.connect(stats_ready)  # job id, {path: FileStat}, set them and sort again
+        job.start()
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import re
+import stat
+
+from PySide2 import QtCore
+from PySide2.QtCore import QObject, Signal
+
+from libs.frecency import access_store, access_key
+from libs.listing import file_stat, MISSING_STAT
+from libs.tracing import span
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+# Sort types, the names of the "Sort by..." menu actions.
+SORT_FILE_TYPE = "File Type"
+SORT_USAGE = "Usage"
+SORT_NAME = "Name"
+SORT_SIZE = "Size"
+SORT_DATE_ADDED = "Date Added"
+SORT_TYPES = (SORT_FILE_TYPE, SORT_USAGE, SORT_NAME, SORT_SIZE, SORT_DATE_ADDED)
+STAT_SORT_TYPES = (SORT_SIZE, SORT_DATE_ADDED)
+
+STAT_BATCH_SIZE = 256
+MAX_STAT_THREADS = 8
+
+_digits = re.compile(r"(\d+)")
+
+
+def natural_key(text: str):
+    """
+    Sort key that orders numbers by value, IE: file2 before file10. Case is ignored.
+    """
+    parts = _digits.split(text.casefold())
+    # Odd parts are the numbers, tagging parts keeps numbers and text from being compared to each other.
+    return tuple((0, int(p), p) if i % 2 else (1, p) for i, p in enumerate(parts) if p)
+
+
+def stat_paths(paths: list):
+    """
+    :return: {path: FileStat}, MISSING_STAT if the file could not be read.
+    """
+    results = {}
+    for path in paths:
+        try:
+            results[path] = file_stat(os.stat(path))
+        except OSError:
+            results[path] = MISSING_STAT
+    return results
+
+
+class StatSignals(QObject):
+    finished = Signal(int, object)  # job id, {path: FileStat}
+
+
+class StatJob(QtCore.QRunnable):
+    """
+    Stats paths in parallel batches on the global thread pool, so slow network drives overlap.
+    """
+
+    def __init__(self, job_id: int, paths: list):
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.signals = StatSignals()
+        self._job_id = job_id
+        self._paths = paths
+
+    def job_id(self):
+        return self._job_id
+
+    def start(self):
+        QtCore.QThreadPool.globalInstance().start(self)
+
+    def run(self):
+        with span("sort.stat", "sort", items=len(self._paths)):
+            batches = [self._paths[i:i + STAT_BATCH_SIZE] for i in range(0, len(self._paths), STAT_BATCH_SIZE)]
+            stats = {}
+            if len(batches) == 1:
+                stats = stat_paths(batches[0])
+            elif batches:
+                with ThreadPoolExecutor(max_workers=min(MAX_STAT_THREADS, len(batches))) as executor:
+                    for results in executor.map(stat_paths, batches):
+                        stats.update(results)
+        self.signals.finished.emit(self._job_id, stats)
+
+
+class PinSorter:
+    """
+    Sort keys of the items of one pin list.
+
+        sorter = PinSorter()
+        order = sorter.order(items, SORT_NAME)  # Current row numbers in their sorted order.
+        sorter.invalidate(item)  # After the item changed.
+    """
+
+    def __init__(self):
+        self._keys = {}  # sort type: {FileItem: key}
+
+    def invalidate(self, item=None):
+        """
+        Forget the keys of an item, or of all items.
+        """
+        if item is None:
+            self._keys.clear()
+            return
+
+        for keys in self._keys.values():
+            keys.pop(item, None)
+
+    def needs_stat(self, items: list, sort_type: str):
+        """
+        :return: list of the items that order() would stat, stat them off the GUI thread first.
+        """
+        if sort_type not in STAT_SORT_TYPES:
+            return []
+        keys = self._keys.get(sort_type, {})
+        return [item for item in items if item not in keys and not item.has_file_stat()
+                and (sort_type == SORT_SIZE or item.date_added() is None)]
+
+    def order(self, items: list, sort_type: str):
+        """
+        :return: list of row numbers of items in sorted order, the sort is stable.
+        """
+        if sort_type not in SORT_TYPES:
+            raise ValueError("Unknown sort type {}".format(sort_type))
+
+        keys = self._keys.setdefault(sort_type, {})
+        missing = [item for item in items if item not in keys]
+        if missing:
+            with span("sort.keys", "sort", sort_type=sort_type, items=len(missing)):
+                for item in missing:
+                    keys[item] = self.key(item, sort_type)
+
+        with span("sort.order", "sort", items=len(items)):
+            if sort_type == SORT_USAGE:
+                rank = access_store().rank
+                usage_key = lambda row: (-rank(keys[items[row]][0]),) + keys[items[row]][1:]
+                return sorted(range(len(items)), key=usage_key)
+            return sorted(range(len(items)), key=lambda row: keys[items[row]])
+
+    def key(self, item, sort_type: str):
+        if sort_type == SORT_NAME:
+            return natural_key(item.nice_name())
+
+        if sort_type == SORT_FILE_TYPE:
+            return natural_key(item.sort_token())
+
+        if sort_type == SORT_USAGE:
+            # Most accessed first, clicks saved with older pins break ties.
+            return access_key(item.file_path()), -item.clicked_times(), natural_key(item.nice_name())
+
+        if sort_type == SORT_SIZE:
+            # Largest first, folders and missing files go last.
+            st = item.file_stat()
+            if st.size is None or stat.S_ISDIR(st.mode):
+                return 1, 0, natural_key(item.nice_name())
+            return 0, -st.size, natural_key(item.nice_name())
+
+        # Newest first. Pins from before the date was recorded fall back to the file's creation time.
+        added = item.date_added()
+        if added is None:
+            added = item.file_stat().ctime or 0
+        return -added, natural_key(item.nice_name())
@@ -0,0 +1,80 @@
+"""
+Startup profiling.
+
+Run with --profile-startup to print how long each startup phase took and quit once startup finished:
+
+    python main_window.py --profile-startup
+
+The last line of the report is the same numbers as JSON, for tracking them across changes. Marks cost a
+function call when profiling is off.
+"""
+
+import json
+import logging
+import time
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+PROFILE_STARTUP_FLAG = "--profile-startup"
+
+_startup_profiler = None
+
+
+def startup_profiler():
+    global _startup_profiler
+    if _startup_profiler is None:
+        _startup_profiler = StartupProfiler()
+    return _startup_profiler
+
+
+class StartupProfiler:
+    """
+    Records the time between marks, each mark ends the phase it names.
+    """
+
+    def __init__(self):
+        self._enabled = False
+        self._start = time.perf_counter()
+        self._last = self._start
+        self._phases = []  # [(name, seconds)]
+
+    def enable(self, start_time=None):
+        """
+        :param start_time: time.perf_counter() of when startup began, IE: before the first import.
+        """
+        self._enabled = True
+        if start_time is not None:
+            self._start = self._last = start_time
+
+    def is_enabled(self):
+        return self._enabled
+
+    def mark(self, phase: str):
+        if not self._enabled:
+            return
+        now = time.perf_counter()
+        self._phases.append((phase, now - self._last))
+        self._last = now
+
+    def phases(self):
+        return list(self._phases)
+
+    def total(self):
+        return self._last - self._start
+
+    def report(self):
+        """
+        :return: str, a table of the phases followed by a line of JSON.
+        """
+        width = max([len(name) for name, _ in self._phases] + [5])
+        lines = ["Startup profile"]
+        for name, seconds in self._phases:
+            lines.append("  {:<{}}  {:8.1f} ms".format(name, width, seconds * 1000))
+        lines.append("  {:<{}}  {:8.1f} ms".format("total", width, self.total() * 1000))
+
+        data = {name: round(seconds * 1000, 2) for name, seconds in self._phases}
+        data["total"] = round(self.total() * 1000, 2)
+        lines.append(json.dumps(data))
+        return "\n".join(lines)
@@ -0,0 +1,142 @@
+"""
+Tracing spans for the hot paths.
+
+Spans time a block of code and, while tracing is on, record it as a Chrome trace event. Saved traces open
+in chrome://tracing or https://ui.perfetto.dev.
+
+    with span("listing.scandir", path=path):
+        ...
+
+    @traced("search")
+    def search(self, ...):
+        ...
+
+When tracing is off span() returns a shared do-nothing context manager, the cost is a function call and
+a global lookup. Spans go around batches, not around per item work.
+"""
+
+from collections import deque
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+MAX_TRACE_EVENTS = 1000000  # Oldest events are dropped past this.
+
+_enabled = False
+_events = deque(maxlen=MAX_TRACE_EVENTS)
+_thread_names = {}
+_pid = os.getpid()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("_name", "_category", "_args", "_start")
+
+    def __init__(self, name: str, category: str, args: dict):
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        end = time.perf_counter_ns()
+        tid = threading.get_ident()
+        if tid not in _thread_names:
+            _thread_names[tid] = threading.current_thread().name
+
+        event = {"name": self._name, "cat": self._category, "ph": "X", "pid": _pid, "tid": tid,
+                 "ts": self._start // 1000, "dur": (end - self._start) // 1000}
+        if self._args:
+            event["args"] = self._args
+        _events.append(event)
+        return False
+
+
+def span(name: str, category="app", **args):
+    """
+    :param args: shown with the span in the trace viewer, keep them small.
+    """
+    if not _enabled:
+        return NULL_SPAN
+    return Span(name, category, args)
+
+
+def traced(name=None, category="app"):
+    """
+    Decorator, wraps every call of the function in a span named after it.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, category, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_enabled():
+    return _enabled
+
+
+def start():
+    """
+    Start recording, events of an earlier recording are dropped.
+    """
+    global _enabled
+    _events.clear()
+    _enabled = True
+    log.info("Tracing started")
+
+
+def stop():
+    global _enabled
+    _enabled = False
+    log.info("Tracing stopped, {} events".format(len(_events)))
+
+
+def event_count():
+    return len(_events)
+
+
+def save(path: str):
+    """
+    Write the recorded events as Chrome trace JSON.
+    """
+    events = list(_events)
+    for tid, thread_name in list(_thread_names.items()):
+        events.append({"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid, "args": {"name": thread_name}})
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    log.info("Saved trace {}".format(path))
+    return path
@@ -1,3 +1,6 @@
+import logging
+import math
+import re
 import time
 
 from PySide2 import QtWidgets, QtCore
@@ -7,13 +10,92 @@ import traceback
 import sys
 import os
 from libs.consts import FULL_PATH
+from libs.index import file_index
+from libs.walker import ParallelWalker
+from libs.content_search import ContentSearcher, parse_file_types, has_file_type
+from libs.fuzzy import fuzzy_score, fold_case, is_subsequence, TopK
+from libs.frecency import access_store, access_key
+from libs.tracing import traced
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+REGEX_CHARACTERS = set(".^$*+?{}[]\\|()")
+
+SEARCH_CHUNK_SIZE = 2048  # Items matched between cancel checks, result and progress signals.
+RANKED_EMIT_INTERVAL = 0.1  # Seconds between updates of the ranked results while a fuzzy search runs.
+MAX_RANKED_RESULTS = 500  # A ranking is replaced as a whole, keep it to what a person will look through.
+# Fuzzy score added per doubling of a path's access score, capped so use never beats a much better match.
+FRECENCY_BONUS = 4 * 1024
+MAX_FRECENCY_BONUS = 32 * 1024
+
+
+def frecency_bonus(score: float):
+    """
+    :param score: access score, see AccessStore.score()
+    :return: int, fuzzy score points.
+    """
+    if score <= 0:
+        return 0
+    return min(MAX_FRECENCY_BONUS, int(math.log2(1 + score) * FRECENCY_BONUS))
+
+
+def is_refinement(previous: str, search_string: str, match_case=False, fuzzy=False):
+    """
+    True when everything search_string matches is also matched by the previous search string.
+    Only plain substrings are compared, any regex syntax makes it a new search. Fuzzy queries refine
+    when the previous query is a subsequence of the new one.
+    """
+    if fuzzy:
+        if not match_case:
+            previous, search_string = previous.lower(), search_string.lower()
+        return bool(previous) and is_subsequence(previous, search_string)
+
+    if not previous or REGEX_CHARACTERS.intersection(previous) or REGEX_CHARACTERS.intersection(search_string):
+        return False
+    if not match_case:
+        previous, search_string = previous.lower(), search_string.lower()
+    return previous in search_string
+
+
+class ContentMatchItem(FileItem):
+    """
+    A line in a file that matched a content search, displayed as "name:line: text".
+    """
+    __slots__ = ("_line_number", "_line_text")
+
+    def __init__(self, item_data: dict, line_number: int, line_text: str):
+        super().__init__(item_data, False)
+        self._line_number = line_number
+        self._line_text = line_text
+
+    def line_number(self):
+        return self._line_number
+
+    def line_text(self):
+        return self._line_text
+
+    def nice_name(self):
+        return "{}:{}: {}".format(self.file_name(), self._line_number, self._line_text)
 
 
 class WorkerSignals(QObject):
-    finished = Signal()
+    finished = Signal(int)  # generation
     error = Signal(tuple)
     result = Signal(object)
-    progress = Signal(int)
+    ranked = Signal(object)  # (generation, [FileItem]) best first, replaces the previous ranking.
+    progress = Signal(int, int)  # generation, percent
+
+
+def compile_search_pattern(search_string: str, match_case=False):
+    """
+    Compile the search string as a regex, strings that are not valid regex are matched literally.
+    """
+    flags = 0 if match_case else re.IGNORECASE
+    try:
+        return re.compile(search_string, flags)
+    except re.error:
+        return re.compile(re.escape(search_string), flags)
 
 
 class Thread(QtCore.QThread):
@@ -29,15 +111,20 @@ class Thread(QtCore.QThread):
                  ):
         """
         This thread is intended to always be running in the background and yield results when fed updates.
-        Otherwise sit idle if nothing to do.
+        Otherwise it sleeps on a wait condition until a new search string comes in.
+
+        A new search string cancels the search that is running, results are emitted through
+        self.signals in chunks of matched FileItems.
 
         :param max_results:
-        :param cache_index: Precache file directries for faster searching.
+        :param cache_index: Precache file directries for faster searching. Matches from the file index
+        (libs.index) are searched after the given items.
+        :param search_directory_list: FileItems to search.
         :param search_string:
         :param match_case:
         :param search_file_contents:
         :param file_content_types:
-        :param mutex:
+        :param mutex: QMutex guarding the query, one is created if not given.
         """
 
         super().__init__()
@@ -45,7 +132,9 @@ class Thread(QtCore.QThread):
         self._exiting = False
         self.signals = WorkerSignals()
         self._max_results = max_results
-        self._mutex = mutex
+        self._cache_index = cache_index
+        self._mutex = mutex or QtCore.QMutex()
+        self._condition = QtCore.QWaitCondition()
 
         # OPTIONS
         self._search_file_contents = search_file_contents
@@ -53,78 +142,380 @@ class Thread(QtCore.QThread):
         self._match_case = match_case
         self._file_content_types = file_content_types
 
-        self._search_list = search_directory_list
-        self._iterable = iter(self._search_list)
+        self._search_list = search_directory_list or []
+        self._search_key = None
         self._recursive = False
-        self._return_count = 0
+        self._fuzzy = False
+        self._content_searcher = None
+
+        # Every new query bumps the generation, a running search stops as soon as it sees a newer one.
+        self._generation = 0
+        self._query_pending = bool(search_string)
+
+        # Complete match set of the last finished query, refined queries only scan these.
+        # Bumping the items version when the search items change invalidates it.
+        self._items_version = 0
+        self._refine_state = None  # (items version, search string, match case, fuzzy, [FileItem])
 
     def run(self, *args):
-        print("Starting Thread")
-        while not self._exiting:
-            time.sleep(.03)
-            if not self._search_string:
-                continue
+        log.debug("Starting search thread")
+        while True:
+            self._mutex.lock()
+            while not self._exiting and not self._query_pending:
+                self._condition.wait(self._mutex)
+
+            if self._exiting:
+                self._mutex.unlock()
+                break
+
+            self._query_pending = False
+            generation = self._generation
+            search_string = self._search_string
+            items = self._search_list
+            items_version = self._items_version
+            self._mutex.unlock()
+
             try:
-                item = next(self._iterable)
-            except StopIteration:
+                self.search(generation, search_string, items, items_version)
+            except Exception:
+                exctype, value = sys.exc_info()[:2]
+                self.signals.error.emit((exctype, value, traceback.format_exc()))
+
+        log.debug("Search thread exited")
+
+    def is_cancelled(self, generation):
+        return self._exiting or generation != self._generation
+
+    def generation(self):
+        return self._generation
+
+    def emit_results(self, generation: int, matches: list):
+        """
+        Results are tagged with the generation of their query, receivers drop results of older queries
+        that were already queued when the query changed.
+        """
+        self.signals.result.emit((generation, matches))
+
+    def refine_candidates(self, search_string: str, items: list, items_version: int):
+        """
+        Items that can match the search string. When it narrows down the last finished query, only that
+        query's matches have to be scanned.
+        """
+        if self._refine_state:
+            version, previous, match_case, fuzzy, matches = self._refine_state
+            if version == items_version and match_case == self._match_case and fuzzy == self._fuzzy and \
+                    is_refinement(previous, search_string, match_case, fuzzy):
+                log.debug("Refining {} matches of '{}'".format(len(matches), previous))
+                return matches
+        return items
+
+    @traced("search", "search")
+    def search(self, generation: int, search_string: str, items: list, items_version=None):
+        """
+        Match all items against the search string, stopping at max results or when the query changes.
+        Matching goes on past max results without emitting, the full match set is what the next,
+        longer query gets refined from.
+        """
+        if self._fuzzy:
+            self.search_fuzzy(generation, search_string, items, items_version)
+            return
+
+        pattern = compile_search_pattern(search_string, self._match_case)
+        candidates = self.refine_candidates(search_string, items, items_version)
+        total = len(candidates)
+        found = 0
+        found_paths = set()
+        all_matches = []
+
+        for start in range(0, total, SEARCH_CHUNK_SIZE):
+            if self.is_cancelled(generation):
+                return
+
+            matches = []
+            for item in candidates[start:start + SEARCH_CHUNK_SIZE]:
+                if self.match(pattern, item):
+                    all_matches.append(item)
+                    if found < self._max_results:
+                        matches.append(item)
+                        found_paths.add(item.file_path())
+                        found += 1
+
+            if matches:
+                self.emit_results(generation, matches)
+            if not self.is_cancelled(generation):
+                self.signals.progress.emit(generation, int(100 * min(total, start + SEARCH_CHUNK_SIZE) / total))
+
+        if self.is_cancelled(generation):
+            return
+        self._refine_state = (items_version, search_string, self._match_case, False, all_matches)
+
+        if self._cache_index and found < self._max_results:
+            found = self.search_index(generation, pattern, search_string, found, found_paths)
+
+        if self._recursive and found < self._max_results:
+            found = self.search_recursive(generation, pattern, items, found, found_paths)
+
+        if self._search_file_contents and found < self._max_results:
+            self.search_contents(generation, search_string, items, found)
+
+        if not self.is_cancelled(generation):
+            self.signals.progress.emit(generation, 100)
+            self.signals.finished.emit(generation)
+
+    @traced("search.fuzzy", "search")
+    def search_fuzzy(self, generation: int, search_string: str, items: list, items_version=None):
+        """
+        Score every candidate and keep the best max results in a bounded heap. The ranking is emitted
+        through signals.ranked whenever it changed, so the best matches so far are shown while scanning.
+        Candidates are the search items, the file index and sub folders if those options are on.
+        Frequently and recently opened paths get a bonus, so among similar matches the ones in use come first.
+        """
+        query = search_string if self._match_case else fold_case(search_string)
+        candidates = self.refine_candidates(search_string, items, items_version)
+        is_cancelled = lambda: self.is_cancelled(generation)
+
+        top = TopK(min(self._max_results, MAX_RANKED_RESULTS))
+        seen_paths = set()
+        all_matches = []
+        last_emit = time.monotonic()
+        access_scores = access_store().scores()
+
+        def offer(path, value):
+            if path in seen_paths:
+                return
+            seen_paths.add(path)
+            score = fuzzy_score(query, path, self._match_case)
+            if score is not None:
+                if access_scores:
+                    score += frecency_bonus(access_scores.get(access_key(path), 0.0))
+                top.push(score, value)
+            return score
+
+        def emit_ranked(force=False):
+            nonlocal last_emit
+            if not top.changed() and not force:
+                return
+            ranked = []
+            for _, value in top.ranked():
+                if not isinstance(value, FileItem):
+                    value = FileItem({FULL_PATH: value[0]}, value[1])
+                ranked.append(value)
+            self.signals.ranked.emit((generation, ranked))
+            last_emit = time.monotonic()
+
+        total = len(candidates)
+        for start in range(0, total, SEARCH_CHUNK_SIZE):
+            if is_cancelled():
+                return
+            for item in candidates[start:start + SEARCH_CHUNK_SIZE]:
+                if offer(item.file_path(), item) is not None:
+                    all_matches.append(item)
+
+            if time.monotonic() - last_emit > RANKED_EMIT_INTERVAL:
+                emit_ranked()
+                self.signals.progress.emit(generation, int(100 * min(total, start + SEARCH_CHUNK_SIZE) / total))
+
+        if is_cancelled():
+            return
+        self._refine_state = (items_version, search_string, self._match_case, True, all_matches)
+
+        sources = []
+        if self._cache_index:
+            sources.append(file_index().iter_entries(is_cancelled))
+        if self._recursive:
+            roots = [i.file_path() for i in items if i.is_dir()]
+            walker = ParallelWalker(roots, is_cancelled=is_cancelled)
+            sources.append((entry.path, entry.is_dir) for entry in walker.walk())
+
+        for source in sources:
+            for path, is_dir in source:
+                offer(path, (path, is_dir))
+                if time.monotonic() - last_emit > RANKED_EMIT_INTERVAL:
+                    if is_cancelled():
+                        return
+                    emit_ranked()
+
+        if not is_cancelled():
+            emit_ranked(force=True)
+            self.signals.progress.emit(generation, 100)
+            self.signals.finished.emit(generation)
+
+    @traced("search.index", "search")
+    def search_index(self, generation: int, pattern, search_string: str, found: int, found_paths: set):
+        """
+        Emit matches from the file index that were not already found in the searched items.
+        :return: number of results found so far.
+        """
+        matches = []
+        is_cancelled = lambda: self.is_cancelled(generation)
+        for path, is_dir in file_index().search(pattern, search_string, is_cancelled=is_cancelled):
+            if path in found_paths:
                 continue
-            try:
-                print(item.file_path())
-            except:
-                pass
-
-            # self.match(item)
-            #
-            # if self._recursive and i.is_dir():
-            #     for root, dirs, files in os.walk(i.file_path()):
-            #         if self._exiting:
-            #             self._exiting = False
-            #             return
-            #
-            #         for d in dirs:
-            #             item = FileItem({FULL_PATH: os.path.join(root, d)})
-            #             self.match(item)
-            #
-            #         for f in files:
-            #             item = FileItem({FULL_PATH: os.path.join(root, f)})
-            #             self.match(item)
 
+            found_paths.add(path)
+            matches.append(FileItem({FULL_PATH: path}, is_dir))
+            found += 1
+            if found >= self._max_results or len(matches) >= SEARCH_CHUNK_SIZE:
+                self.emit_results(generation, matches)
+                matches = []
+            if found >= self._max_results:
+                break
+
+        if matches and not self.is_cancelled(generation):
+            self.emit_results(generation, matches)
+        return found
+
+    @traced("search.recursive", "search")
+    def search_recursive(self, generation: int, pattern, items: list, found: int, found_paths: set):
+        """
+        Walk the sub folders of the searched folder items, shallow matches first.
+        :return: number of results found so far.
+        """
+        roots = [i.file_path() for i in items if i.is_dir()]
+        walker = ParallelWalker(roots, is_cancelled=lambda: self.is_cancelled(generation))
+
+        matches = []
+        last_emit = time.monotonic()
+        for entry in walker.walk():
+            if pattern.search(entry.name) is None or entry.path in found_paths:
+                continue
+
+            found_paths.add(entry.path)
+            matches.append(FileItem({FULL_PATH: entry.path}, entry.is_dir))
+            found += 1
+            if found >= self._max_results:
+                break
+
+            # Walking is slow compared to matching, don't sit on results.
+            if time.monotonic() - last_emit > 0.1:
+                self.emit_results(generation, matches)
+                matches = []
+                last_emit = time.monotonic()
+
+        if matches and not self.is_cancelled(generation):
+            self.emit_results(generation, matches)
+        return found
+
+    @traced("search.contents", "search")
+    def search_contents(self, generation: int, search_string: str, items: list, found: int):
+        """
+        Grep the searched files, and everything below the searched folders when searching sub folders,
+        for the search string. Only files of the content file types are read.
+        """
+        file_types = parse_file_types(self._file_content_types)
+        is_cancelled = lambda: self.is_cancelled(generation)
+
+        def candidates():
+            for item in items:
+                if not item.is_dir() and has_file_type(item.file_path(), file_types):
+                    yield item.file_path()
+
+            if self._recursive:
+                roots = [i.file_path() for i in items if i.is_dir()]
+                for entry in ParallelWalker(roots, is_cancelled=is_cancelled).walk():
+                    if not entry.is_dir and has_file_type(entry.path, file_types):
+                        yield entry.path
+
+        if not self._content_searcher:
+            self._content_searcher = ContentSearcher()
+
+        matches = []
+        last_emit = time.monotonic()
+        results = self._content_searcher.search(candidates(), search_string, self._match_case, is_cancelled)
+        try:
+            for match in results:
+                matches.append(ContentMatchItem({FULL_PATH: match.path}, match.line_number, match.line))
+                found += 1
+                if found >= self._max_results:
+                    break
+
+                if time.monotonic() - last_emit > 0.1:
+                    self.emit_results(generation, matches)
+                    matches = []
+                    last_emit = time.monotonic()
+        finally:
+            # Cancels the queued grep tasks, also when emitting raised.
+            results.close()
+
+        if matches and not self.is_cancelled(generation):
+            self.emit_results(generation, matches)
+        return found
+
+    def match(self, pattern, file_item):
+        return pattern.search(file_item.nice_name()) is not None
 
     def reset_search(self):
         """
-        Reset the search iterable and start over.
+        Start the current search over, cancelling the one that is running.
+        :return: generation of the new search.
         """
-        self._iterable = iter(self._search_list)
+        self._mutex.lock()
+        self._generation += 1
+        generation = self._generation
+        self._query_pending = bool(self._search_string)
+        self._condition.wakeAll()
+        self._mutex.unlock()
+        return generation
+
+    def cancel(self):
+        self._mutex.lock()
+        self._generation += 1
+        self._query_pending = False
+        self._mutex.unlock()
 
     def set_search_string(self, search_string: str):
         """
         Update the current search string.
-
+        :return: generation of the new search, results are emitted as (generation, [FileItem])
         """
-        print("Updating Search String {}".format(search_string))
+        log.debug("Updating Search String {}".format(search_string))
         self._search_string = search_string
-        self.reset_search()
+        return self.reset_search()
+
+    def set_search_items(self, items, key=None):
+        """
+        :param items: list of FileItems, not changed afterwards.
+        :param key: optional, IE: CandidateSet.key(). Items with the same key are the same items, which
+        saves comparing them.
+        """
+        self._mutex.lock()
+        # Same items in the same order keep the refinement state, FileItems compare by identity.
+        if key is not None:
+            changed = key != self._search_key
+        else:
+            changed = items != self._search_list
+        if changed:
+            self._search_list = items
+            self._items_version += 1
+        self._search_key = key
+        self._mutex.unlock()
 
-    def set_search_items(self, items):
-        self._search_list = items
-        self.reset_search()
+    def set_cache_index(self, cache_index):
+        self._cache_index = cache_index
+
+    def set_search_file_contents(self, search_file_contents, file_content_types=None):
+        self._search_file_contents = search_file_contents
+        self._file_content_types = file_content_types
+
+    def set_fuzzy(self, fuzzy):
+        """
+        Fuzzy mode ranks path subsequence matches instead of streaming regex matches. File contents are
+        not searched in fuzzy mode.
+        """
+        self._fuzzy = fuzzy
 
     def set_search_recursive(self, recursive):
         self._recursive = recursive
 
-    def match(self, file_item):
-        match = False
-        self._return_count += 1
-        if self._return_count > self._max_results:
-            self._exiting = True
-        if match:
-            self.signals.result.emit(file_item)
+    def set_max_results(self, max_results):
+        self._max_results = max_results
 
     def exit(self, *args):
-        print("Exiting Thread")
+        log.debug("Exiting search thread")
+        self._mutex.lock()
         self._exiting = True
+        self._condition.wakeAll()
+        self._mutex.unlock()
+        if self._content_searcher:
+            self._content_searcher.shutdown()
         super().exit(*args)
-
-
-
-
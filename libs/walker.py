@@ -0,0 +1,115 @@
+"""
+Parallel recursive directory walker used by "Search Sub-Folders".
+
+ParallelWalker lists all folders of one depth at the same time on a thread pool and yields their entries
+before going a level deeper, so shallow matches come in first. Folders are remembered by (device, inode)
+so symlinked folders pointing back up the tree are only walked once. DirEntry.stat() leaves both at 0 on
+Windows, sub folders are stat'ed by path there.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+import os
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.DEBUG)
+
+
+MAX_WALK_THREADS = min(32, (os.cpu_count() or 1) * 4)
+
+WalkEntry = namedtuple("WalkEntry", ["path", "name", "is_dir"])
+
+
+def dir_key(st: os.stat_result):
+    return st.st_dev, st.st_ino
+
+
+def scan_directory(path: str, is_cancelled=None):
+    """
+    List a folder.
+    :return: ([WalkEntry], [(sub folder path, (device, inode))])
+    """
+    entries = []
+    sub_dirs = []
+    if is_cancelled and is_cancelled():
+        return entries, sub_dirs
+
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                entries.append(WalkEntry(entry.path.replace('\\', '/'), entry.name, is_dir))
+                if is_dir:
+                    try:
+                        st = entry.stat(follow_symlinks=entry.is_symlink())
+                        if not st.st_ino:
+                            st = os.stat(entry.path)
+                    except OSError:
+                        continue
+                    sub_dirs.append((entries[-1].path, dir_key(st)))
+    except OSError as ex:
+        log.debug("Skipping {}: {}".format(path, ex))
+
+    return entries, sub_dirs
+
+
+class ParallelWalker:
+    """
+    Breadth first walk of the folders below a set of roots.
+
+        walker = ParallelWalker(["C:/Projects"], is_cancelled=lambda: cancelled)
+        for entry in walker.walk():
+            ...
+
+    Stop consuming walk() to stop the walk, pending folders are dropped.
+    """
+
+    def __init__(self, roots, max_workers=MAX_WALK_THREADS, is_cancelled=None, max_depth=None):
+        self._roots = list(roots)
+        self._max_workers = max_workers
+        self._is_cancelled = is_cancelled or (lambda: False)
+        self._max_depth = max_depth
+
+    def walk(self):
+        visited = set()
+        level = []
+        for root in self._roots:
+            try:
+                key = dir_key(os.stat(root))
+            except OSError:
+                continue
+            if key not in visited:
+                visited.add(key)
+                level.append(root)
+
+        depth = 0
+        executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="walker")
+        try:
+            while level and not self._is_cancelled():
+                futures = [executor.submit(scan_directory, path, self._is_cancelled) for path in level]
+                next_level = []
+
+                for future in as_completed(futures):
+                    if self._is_cancelled():
+                        return
+
+                    entries, sub_dirs = future.result()
+                    for entry in entries:
+                        yield entry
+
+                    for path, key in sub_dirs:
+                        if key not in visited:
+                            visited.add(key)
+                            next_level.append(path)
+
+                depth += 1
+                if self._max_depth is not None and depth > self._max_depth:
+                    break
+                level = next_level
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
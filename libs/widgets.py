@@ -14,14 +14,20 @@ import logging
 import os
 import shutil
 import subprocess
+import time
 from functools import partial
 
 from PySide2 import QtWidgets, QtCore, QtGui
 from PySide2.QtCore import Signal
 
 from libs.consts import *
-
-ICON_PROVIDER = QtWidgets.QFileIconProvider()
+from libs.models import FileTableModel
+from libs.listing import DirectoryLister, listing_cache, file_stat, MISSING_STAT
+from libs.icons import icon_cache
+from libs.tracing import span
+from libs.sorting import PinSorter, StatJob, SORT_TYPES
+from libs.folder_sizes import FolderSizeJob, folder_size_cache, invalidate_folder_size
+from libs.frecency import access_store, access_key, WEIGHT_OPEN, WEIGHT_NAVIGATE
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.DEBUG)
@@ -35,100 +41,216 @@ _drop_message = None
 class FileItem:
     """
     This is the (Model) class of storing information about all file paths in the file browsers and favwidgets.
-    QTableWidgetItem, QTreeWidgetItem and QListWidgetItems (View) are only used for displaying this data.
+    FileTableModel and the views on top of it are only used for displaying this data.
 
     When dragging an item from the Browser or FavWidget, we pass the FileItem object and it is up to the
-    receiving browser on how to display data from that object. A reference to the file item is stored in the
-    (View) object's data property.
+    receiving browser on how to display data from that object. A reference to the file item is returned by the
+    (Model) data for its row.
 
 
     For example:
 
-        FILE_ITEM_DATA_ROLE = 1
-        QTableWidgetItem.setData(FILE_ITEM_DATA_ROLE, FileItem)
+        model.data(index, FILE_ITEM_DATA_ROLE) -> FileItem
 
     Note:
         In following with Qt design Patterns, it is preferable to get/set values via properties in this class.
-    """
-
-    _file_info = QtCore.QFileInfo()
-    _full_path = None
-    _icon = None
-    _nice_name = ""
-    _clicked_times = 0
-    _sort_token = ""
-
 
-    def __init__(self, item_data: dict):
-        super().__init__()
+    Items are slotted and only hold what they were created with, the QFileInfo, file name, suffix and sort
+    token are worked out on first use. Listings and search results can hold millions of these.
+    Size, times and mode come with listings that were made with stats, other items stat on first use.
+    """
 
-        self._color = [1.0, 1.0, 1.0, 1.0]
+    __slots__ = ("_full_path", "_nice_name", "_clicked_times", "_sort_token", "_color",
+                 "_file_name", "_suffix", "_is_dir", "_file_info", "_stat", "_extra")
 
-        self.__dict__.update(item_data)
-        self._file_info = QtCore.QFileInfo(self._full_path)
-        self._file_name = self._file_info.fileName()
-        self._suffix = self._file_info.completeSuffix()
+    # Keys that are always written by toJSON, the others only when they have been set.
+    _json_keys = ("_full_path", "_file_name", "_suffix", "_sort_token", "_color")
+    _optional_json_keys = ("_nice_name", "_clicked_times", "_is_dir")
 
-        if self.is_dir():
-            self._suffix = "0"
+    def __init__(self, item_data: dict, is_dir=None, stat=None):
+        """
+        :param item_data: Serialized item data, at least {FULL_PATH: path}
+        :param is_dir: Bool if already known, IE: from a directory listing. Saves a stat call.
+        Saved items know it too.
+        :param stat: FileStat if already known, IE: from a directory listing.
+        """
+        self._full_path = None
+        self._nice_name = None
+        self._clicked_times = None
+        self._sort_token = None
+        self._color = None
+        self._file_name = None
+        self._suffix = None
+        self._is_dir = is_dir
+        self._file_info = None
+        self._stat = stat
+        self._extra = None
+
+        for k, v in item_data.items():
+            if k in FileItem.__slots__ and k not in ("_file_info", "_stat", "_extra"):
+                setattr(self, k, v)
+            else:
+                # Keep data we don't know about so it is saved again unchanged.
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[k] = v
 
-        if not self._sort_token:
-            self._sort_token = self._suffix + self._file_name
+        if is_dir is not None:
+            self._is_dir = is_dir
 
     def file_path(self):
         return self._full_path
 
     def file_name(self):
+        if self._file_name is None:
+            self._file_name = os.path.basename(self._full_path)
         return self._file_name
 
     def file_leaf(self):
         return os.path.split(self._full_path)[-1]
 
+    def nice_name(self):
+        """
+        Name the item is displayed with, pins can be renamed without renaming the source file.
+        """
+        return self._nice_name or self.file_name()
+
+    def set_nice_name(self, name: str):
+        self._nice_name = name
+
     def is_dir(self):
-        return self._file_info.isDir()
+        if self._is_dir is None:
+            self._is_dir = self.file_info().isDir()
+        return self._is_dir
 
     def file_info(self):
+        if self._file_info is None:
+            self._file_info = QtCore.QFileInfo(self._full_path)
         return self._file_info
 
     def suffix(self):
+        """
+        Complete suffix IE: tar.gz, directories use "0" so they sort first.
+        """
+        if self._suffix is None:
+            if self.is_dir():
+                self._suffix = "0"
+            else:
+                name = self.file_name()
+                self._suffix = name.split(".", 1)[1] if "." in name else ""
         return self._suffix
 
+    def file_stat(self):
+        """
+        :return: FileStat, fields are None if the file could not be read.
+        """
+        if self._stat is None:
+            try:
+                self._stat = file_stat(os.stat(self._full_path))
+            except OSError:
+                self._stat = MISSING_STAT
+        return self._stat
+
+    def set_file_stat(self, stat):
+        self._stat = stat
+
+    def has_file_stat(self):
+        """
+        :return: Bool, file_stat() will not touch the disk.
+        """
+        return self._stat is not None
+
+    def file_size(self):
+        """
+        :return: int bytes, for folders the size of everything in them once it has been worked out, else None.
+        """
+        if self.is_dir():
+            total = folder_size_cache().total(self._full_path)
+            return total[0] if total else None
+        return self.file_stat().size
+
+    def file_count(self):
+        """
+        :return: int files in a folder and its sub folders once worked out, None for files.
+        """
+        if not self.is_dir():
+            return None
+        total = folder_size_cache().total(self._full_path)
+        return total[1] if total else None
+
+    def date_modified(self):
+        return self.file_stat().mtime
+
+    def date_created(self):
+        return self.file_stat().ctime
+
+    def permissions(self):
+        """
+        :return: int st_mode
+        """
+        return self.file_stat().mode
+
+    def file_kind(self):
+        if self.is_dir():
+            return "Folder"
+        name = self.file_name()
+        if "." in name.strip("."):
+            return "{} File".format(name.rsplit(".", 1)[1].upper())
+        return "File"
+
     def sort_token(self):
+        if not self._sort_token:
+            self._sort_token = self.suffix() + self.file_name()
         return self._sort_token
 
+    def clicked_times(self):
+        return self._clicked_times or 0
+
+    def date_added(self):
+        """
+        :return: time.time() of when the item was pinned, None if not pinned or pinned before this was kept.
+        """
+        if self._extra is None:
+            return None
+        return self._extra.get(DATE_ADDED)
+
+    def set_date_added(self, date_added: float):
+        # Kept with the extra data, only pins have it.
+        if self._extra is None:
+            self._extra = {}
+        self._extra[DATE_ADDED] = date_added
+
     def icon(self):
-        return ICON_PROVIDER.icon(self._file_info)
+        return icon_cache().icon(self)
 
     def set_color(self, color):
         if isinstance(color, QtGui.QColor):
-            print(color.getRgbF())
             self._color = list(color.getRgbF())
         else:
             self._color = color
 
     def color(self):
+        if self._color is None:
+            return list(DEFAULT_ITEM_COLOR)
         return self._color
 
     def toJSON(self):
-        serializable_types = [int, list, dict, float, str]
-        obj_data = {}
-        for k, v in self.__dict__.items():
-            can_serialize = False
-            for i in serializable_types:
-                if isinstance(v, i):
-                    can_serialize = True
-            if can_serialize:
-                obj_data[k] = v
-        return obj_data
-
-
-
-
-
-
+        # Resolve the lazy values so saved data matches what was loaded.
+        self.sort_token()
 
+        obj_data = {}
+        if self._extra:
+            obj_data.update(self._extra)
 
+        for k in self._json_keys:
+            obj_data[k] = getattr(self, k)
+        obj_data["_color"] = self.color()
 
+        for k in self._optional_json_keys:
+            v = getattr(self, k)
+            if v is not None:
+                obj_data[k] = v
+        return obj_data
 
 
 class AbstractDockWindow:
@@ -278,6 +400,7 @@ class BaseFileListWidget:  # MIXIN CLASS
     path_changed = Signal(object)
     new_tab = Signal(object)
     new_pin = Signal(object)
+    view_mode_changed = Signal(str)  # TABLE_VIEW_MODE or LIST_VIEW_MODE picked from the context menu.
 
     def __init__(self, *args):
         log.debug("init BaseFileWidget []".format(args))
@@ -306,10 +429,7 @@ class BaseFileListWidget:  # MIXIN CLASS
             event.accept()
             return
 
-        file_items = []
-        for i in self.selectedItems():
-            file_items.append(i.item)
-        _drop_message = file_items
+        _drop_message = self.selected_file_items()
         event.accept()
 
     def dropEvent(self, event):
@@ -328,11 +448,14 @@ class BaseFileListWidget:  # MIXIN CLASS
     def get_items(self):
         return self._items
 
+    def selected_file_items(self):
+        raise NotImplementedError
 
     def show_in_explorer(self):
         item = self.current_file_item()
         if not item:
             os.startfile(self.parent().get_path())
+            return
         if item.is_dir():
             os.startfile(item.file_path())
         else:
@@ -362,21 +485,17 @@ class BaseFileListWidget:  # MIXIN CLASS
         set_list.triggered.connect(partial(self.set_view, LIST_VIEW_MODE))
 
     def set_view(self, view: str):
-        print("setting view: {}".format(view))
-        browser = self._main_window.get_active_browser()
-        browser.set_view_context(view)
+        self.view_mode_changed.emit(view)
 
     def copy_path(self):
         item = self.current_file_item()
+        if not item:
+            return
         cmd = "ECHO {} | CLIP".format(item.file_path())
         subprocess.run(cmd, shell=True)
 
     def open_in_new_tab(self):
-        for i in self.selectedItems():
-            if isinstance(i, FileItem):
-                item = i
-            else:
-                item = i.item
+        for item in self.selected_file_items():
             if item.is_dir():
                 self.new_tab.emit(item)
 
@@ -392,14 +511,17 @@ class BaseFileListWidget:  # MIXIN CLASS
     def open(self):
         item = self.current_file_item()
         print("got item {}".format(item))
+        if not item:
+            return
         if item.is_dir():
+            # Counted as a navigation by the browser that shows it.
             self.path_changed.emit(item)
         else:
+            access_store().record(item.file_path(), WEIGHT_OPEN)
             os.startfile(item.file_path())
 
     def current_file_item(self):
-        item = self.currentItem()
-        return item.item
+        raise NotImplementedError
 
 # CONTEXT WIDGETS
 class PathLineEdit(BaseFileListWidget, QtWidgets.QLineEdit):
@@ -407,7 +529,18 @@ class PathLineEdit(BaseFileListWidget, QtWidgets.QLineEdit):
         QtWidgets.QLineEdit.__init__(self)
         BaseFileListWidget.__init__(self)
 
-    def selectedItems(self):
+        # Completions are the most accessed folders starting with the text, ranked by the access store.
+        self._completion_model = QtCore.QStringListModel(self)
+        completer = QtWidgets.QCompleter(self._completion_model, self)
+        completer.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+        completer.setCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.setCompleter(completer)
+        self.textEdited.connect(self.update_completions)
+
+    def update_completions(self, text: str):
+        self._completion_model.setStringList(access_store().complete(text))
+
+    def selected_file_items(self):
         return [self.current_file_item()]
 
     def current_file_item(self):
@@ -453,6 +586,15 @@ class SearchOptionsWidget(QtWidgets.QDialog):
         self._recursive_check = QtWidgets.QCheckBox("Search Sub-Folders")
         self.layout().addWidget(self._recursive_check)
 
+        self._cache_index_check = QtWidgets.QCheckBox("Precache file directories for faster searching")
+        self.layout().addWidget(self._cache_index_check)
+
+        self._fuzzy_check = QtWidgets.QCheckBox("Fuzzy Matching")
+        self.layout().addWidget(self._fuzzy_check)
+
+        # Options are needed for searching before the dialog is ever shown.
+        self.load_settings()
+
     def file_contents_option(self):
         return self._file_contents_check.isChecked()
 
@@ -462,13 +604,41 @@ class SearchOptionsWidget(QtWidgets.QDialog):
     def recursive_option(self):
         return self._recursive_check.isChecked()
 
+    def cache_index_option(self):
+        return self._cache_index_check.isChecked()
+
+    @staticmethod
+    def saved_cache_index_option():
+        """
+        The saved cache index option, read without building the dialog.
+        """
+        settings = QtCore.QSettings(os.path.join(SETTINGS_DIR, "search_options_widget.ini"),
+                                    QtCore.QSettings.IniFormat)
+        return str(settings.value('cache_index_check', False)).lower() == 'true'
+
+    def fuzzy_option(self):
+        return self._fuzzy_check.isChecked()
+
+    def search_mode(self):
+        """
+        :return: const IE: SEARCH_EVERYWHERE
+        """
+        return self._search_mode.currentIndex()
+
     def showEvent(self, *args):
         super().showEvent(*args)
 
         self.resize(self._settings.value('size', QtCore.QSize(200, 200)))
+        self.load_settings()
+
+    def load_settings(self):
+        # Ini settings come back as strings.
+        is_checked = lambda key: str(self._settings.value(key, False)).lower() == 'true'
 
-        self._file_contents_check.setChecked(bool(self._settings.value('search_file_contents_check', False)))
-        self._recursive_check.setChecked(bool(self._settings.value('recursive_check', False)))
+        self._file_contents_check.setChecked(is_checked('search_file_contents_check'))
+        self._recursive_check.setChecked(is_checked('recursive_check'))
+        self._cache_index_check.setChecked(is_checked('cache_index_check'))
+        self._fuzzy_check.setChecked(is_checked('fuzzy_check'))
         self._content_file_types_text.setText(self._settings.value('content_file_type', ''))
 
         # Mode
@@ -481,6 +651,8 @@ class SearchOptionsWidget(QtWidgets.QDialog):
         if CAN_SAVE_SETTINGS:
             self._settings.setValue('search_file_contents_check', self._file_contents_check.isChecked())
             self._settings.setValue('recursive_check', self._recursive_check.isChecked())
+            self._settings.setValue('cache_index_check', self._cache_index_check.isChecked())
+            self._settings.setValue('fuzzy_check', self._fuzzy_check.isChecked())
             self._settings.setValue('mode_cbox', self._search_mode.currentIndex())
 
             self._settings.setValue('content_file_type', self._content_file_types_text.text())
@@ -522,6 +694,14 @@ class BrowserWidget(QtWidgets.QWidget):
         self.history = []
         self.history_idx = 0
 
+        # Watch the current directory, bursts of changes are coalesced into one refresh.
+        self._watcher = QtCore.QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.directory_changed)
+        self._refresh_timer = QtCore.QTimer(self)
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self._first_change_time = None
+
         self.central_layout = QtWidgets.QVBoxLayout()
         self.setLayout(self.central_layout)
         self.layout().setContentsMargins(0, 5, 0, 0)
@@ -533,19 +713,24 @@ class BrowserWidget(QtWidgets.QWidget):
 
         # VIEW CONTEXT
         # self.table_view = createView(QtWidgets.QTableWidget, FileTableWidget, main_window, ["file_name", "file_path"])
-        self.table_view = FileViewWidget([FILE_NAME, FILE_PATH])
+        self.table_view = FileViewWidget(BROWSER_DISPLAY_KEYS, [FILE_NAME, FILE_PATH])
         self.table_view.is_active.connect(self.set_active)  # Signal
 
-        self.list_view = FileViewWidget([FILE_NAME, FILE_PATH])
-        # self.list_view = createView(QtWidgets.QListWidget, FileListWidget, main_window)
+        # Lists nothing itself, shows the rows of the table view.
+        self.list_view = FileListWidget(self.table_view)
         self.list_view.is_active.connect(self.set_active)  # Signal
 
+        self.table_view.view_mode_changed.connect(self.set_view_context)
+        self.list_view.view_mode_changed.connect(self.set_view_context)
+
         self.central_layout.addWidget(self.list_view)
         self.central_layout.addWidget(self.table_view)
         self.set_view_context(TABLE_VIEW_MODE)
 
         # SIGNAL
         self.path_line_edit.textEdited.connect(self.set_path_edit)
+        self.path_line_edit.returnPressed.connect(self.path_edit_accepted)
+        self.path_line_edit.completer().activated[str].connect(lambda text: self.path_edit_accepted())
 
         # Additional
         self.path_line_edit.setAutoFillBackground(True)
@@ -558,6 +743,7 @@ class BrowserWidget(QtWidgets.QWidget):
     def set_view_context(self, context: str):
         """
         Switch view context- Table, List or *Tree(might be supported in the future.)
+        Both views show the same model and selection, switching does not list the directory again.
         :param context: const IE: TABLE_VIEW_MODE
         """
 
@@ -573,14 +759,30 @@ class BrowserWidget(QtWidgets.QWidget):
             self.list_view.show()
             self._view_context = self.list_view
 
-        if self._full_path:
-            self.set_path(self._full_path, is_dir=True, history=False, set_text=False)
+        else:
+            return
+
+        current = self._view_context.currentIndex()
+        if current.isValid():
+            self._view_context.scrollTo(current)
 
     def set_path_edit(self):
         path = self.path_line_edit.text()
         if os.path.isdir(self.path_line_edit.text()):
             self.set_path(path, set_text=False)
 
+    def path_edit_accepted(self):
+        """
+        Return pressed or a completion picked. A typed path counts as a navigation once it is accepted, not
+        for every folder passed on the way.
+        """
+        path = self.path_line_edit.text()
+        if not os.path.isdir(path):
+            return
+        if not self._item or access_key(path) != access_key(self._item.file_path()):
+            self.set_path(path, set_text=False)
+        access_store().record(path, WEIGHT_NAVIGATE, is_dir=True)
+
     def set_path(self, path, history=True, set_text=True):
         """
         :param path: FileItem or Str
@@ -598,13 +800,19 @@ class BrowserWidget(QtWidgets.QWidget):
         self.setWindowTitle(self._item.file_leaf())
 
         if self._item.is_dir():
-            self._view_context.set_root_directory(self._item)
+            self._refresh_timer.stop()
+            self._first_change_time = None
+            self.table_view.set_root_directory(self._item)
+            self.watch_directory(self._item.file_path())
             if set_text:
                 self.path_line_edit.setText(self._item.file_path())
             self.set_color()
 
             # TODO: This is ugly, make it clean.
             if history and not self.history or history and self.history[-1] != self._item:
+                # The first path of a browser is where it was opened or restored, not a navigation.
+                if self.history and set_text:
+                    access_store().record(self._item.file_path(), WEIGHT_NAVIGATE, is_dir=True)
                 self.history.append(self._item)
                 self.history_idx = len(self.history) -1
 
@@ -614,6 +822,45 @@ class BrowserWidget(QtWidgets.QWidget):
     def get_path(self):
         return self._full_path
 
+    def get_items(self):
+        return self.table_view.get_items()
+
+    def models(self):
+        """
+        Models of all views, the items of the browser change when one of them changes. The list view
+        shows the table view's model.
+        """
+        return [self.table_view.model()]
+
+    def watch_directory(self, path: str):
+        watched = self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+        self._watcher.addPath(path)
+
+    def directory_changed(self, path: str):
+        """
+        Wait for WATCH_REFRESH_DELAY ms of quiet before refreshing, a steady stream of changes still
+        refreshes at least every WATCH_MAX_REFRESH_DELAY ms.
+        """
+        now = time.monotonic()
+        if self._first_change_time is None:
+            self._first_change_time = now
+
+        waited = (now - self._first_change_time) * 1000
+        self._refresh_timer.start(max(0, min(WATCH_REFRESH_DELAY, WATCH_MAX_REFRESH_DELAY - waited)))
+
+    def refresh(self):
+        self._first_change_time = None
+        if self._item:
+            invalidate_folder_size(self._item.file_path())
+        self.table_view.refresh_directory()
+
+        # Keep the search index in step with what we see change.
+        from libs.index import file_index, IndexUpdater  # Only needed once the index is in use.
+        if self._item and file_index().is_indexed(self._item.file_path()):
+            IndexUpdater(directories=[self._item.file_path()]).start()
+
     def back(self):
         if self.history_idx > 0:
             self.history_idx -= 1
@@ -641,8 +888,9 @@ class BrowserWidget(QtWidgets.QWidget):
 
 
     def set_dir(self):
-        item = self._view_context.currentItem()
-        self.set_path(item.file_path(), is_dir=item.file_info.isDir())
+        item = self._view_context.current_file_item()
+        if item:
+            self.set_path(item)
 
     def mouseDoubleClickEvent(self, event):
         self.set_dir()
@@ -656,112 +904,404 @@ class BrowserWidget(QtWidgets.QWidget):
     # def mouseMoveEvent(self, event):
     #     print("Move!")
 
-class FileTableWidget(BaseFileListWidget, QtWidgets.QTableWidget):
+class FileTableWidget(BaseFileListWidget, QtWidgets.QTableView):
 
     def __init__(self, display_keys: list):
         """
         :param display_keys: Table Columns to display.
-        IE:
-
+        IE: [FILE_NAME, FILE_PATH]
         """
         print("Initialize FileTableWidget")
-        QtWidgets.QTableWidget.__init__(self)
+        QtWidgets.QTableView.__init__(self)
         BaseFileListWidget.__init__(self)
 
         # Cells we wish to display from FileItems in the list.
         self.directory = ""
         self._display_keys = display_keys
-        self.setColumnCount(len(display_keys))
-        self.setRowCount(1)
+        self._model = FileTableModel(display_keys, self)
+        self.setModel(self._model)
 
         # Setup table appearance
+        self.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.setShowGrid(False)
+        self.setWordWrap(False)
         self.horizontalHeader().setStretchLastSection(True)
         self.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Interactive)
 
+        # Fixed row heights, the view never has to measure rows it does not draw.
+        self.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
         self.verticalHeader().hide()
 
     def set_display_keys(self):
         pass
 
     def clear(self):
-        super().clear()
-        self.setRowCount(0)
+        self._model.clear()
+
+    def get_items(self):
+        return self._model.items()
 
     def add_item(self, item: FileItem):
         """
-        Create a row and populate it with values from the FileItem.__dict__
+        Append a row displaying the FileItem, the model reads the cells from the item
         base on self._display_keys that have been set.
         :param item:
-        :return:
         """
-        # print("adding item {}".format(item))
-        self._items.append(item)
+        self._model.add_item(item)
 
-        row = self.rowCount()
-        self.setRowCount(row + 1)
+    def add_items(self, items: list):
+        """
+        Append many FileItems with a single model insert.
+        """
+        self._model.add_items(items)
 
-        table_items = []
+    def selected_rows(self):
+        return sorted(set(i.row() for i in self.selectionModel().selectedIndexes()))
 
-        for key in self._display_keys:
-            if hasattr(item, key):
-                attr = getattr(item, key)
-                value = str(attr())
-                table_item = QtWidgets.QTableWidgetItem(value)
-                table_item.item = item
-                if item.color():
-                    color = QtGui.QColor()
-                    color.setRgbF(*item.color())
-                    table_item.setBackgroundColor(color)
+    def selected_file_items(self):
+        return [self._model.item(row) for row in self.selected_rows()]
 
-                # table_item.setData(FILE_ITEM_DATA_ROLE, item)
-            else:
-                table_item = QtWidgets.QTableWidgetItem("NO DATA {}".format(key))
+    def current_file_item(self):
+        index = self.currentIndex()
+        if not index.isValid():
+            return None
+        return self._model.item(index.row())
+
+    def dragMoveEvent(self, event):
+        # Drops are handled by BaseFileListWidget.dropEvent, not by the model.
+        event.accept()
+
+
+class FileListWidget(BaseFileListWidget, QtWidgets.QListView):
+    """
+    Icon and name grid over the model of a FileTableWidget. Rows, selection and the current item are shared
+    with the table, items dropped here go to it.
 
-            table_items.append(table_item)
+    List mode with wrapping rather than icon mode, with uniform item sizes the list view works out where an
+    item goes from its row alone, icon mode keeps a position for every item. Layout runs in batches so a
+    large listing never blocks the event loop.
+    """
+
+    def __init__(self, table_view: FileTableWidget):
+        QtWidgets.QListView.__init__(self)
+        BaseFileListWidget.__init__(self)
 
-        # Set icon for first item in the list.
-        table_items[0].setIcon(item.icon())
+        self._table_view = table_view
+        self._model = table_view.model()
+        self.setModel(self._model)
+        self.setModelColumn(0)
+
+        own_selection_model = self.selectionModel()
+        self.setSelectionModel(table_view.selectionModel())
+        own_selection_model.deleteLater()
+
+        self.setViewMode(QtWidgets.QListView.ListMode)
+        self.setFlow(QtWidgets.QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QtWidgets.QListView.Adjust)
+        self.setMovement(QtWidgets.QListView.Static)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QtWidgets.QListView.Batched)
+        self.setBatchSize(LIST_VIEW_BATCH_SIZE)
+
+        self.setIconSize(QtCore.QSize(LIST_VIEW_ICON_SIZE, LIST_VIEW_ICON_SIZE))
+        self.setGridSize(QtCore.QSize(LIST_VIEW_GRID_WIDTH, self.fontMetrics().height() + 6))
+        self.setTextElideMode(QtCore.Qt.ElideMiddle)
+        self.setWordWrap(False)
+
+        self.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
+        self.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
 
-        # Add table_items to the row
-        for col, table_item in enumerate(table_items):
-            self.setItem(row, col, table_item)
+    def clear(self):
+        self._table_view.clear()
+
+    def get_items(self):
+        return self._model.items()
+
+    def add_item(self, item: FileItem):
+        self._table_view.add_item(item)
+
+    def add_items(self, items: list):
+        self._table_view.add_items(items)
+
+    def selected_rows(self):
+        return self._table_view.selected_rows()
+
+    def selected_file_items(self):
+        return self._table_view.selected_file_items()
+
+    def current_file_item(self):
+        index = self.currentIndex()
+        if not index.isValid():
+            return None
+        return self._model.item(index.row())
+
+    def dragMoveEvent(self, event):
+        # Drops are handled by BaseFileListWidget.dropEvent, not by the model.
+        event.accept()
 
 
 class FileViewWidget(FileTableWidget):
-    def __init__(self, display_keys: list):
+    directory_loaded = Signal(object)  # FileItem of the root directory, emitted once the listing completes.
+
+    def __init__(self, display_keys: list, visible_keys=None):
+        """
+        :param visible_keys: Columns shown at first, the others can be turned on from the header menu.
+        All of them if None.
+        """
         super(FileViewWidget, self).__init__(display_keys)
+        self._lister = None
+        self._listing_id = 0
+        self._listing_entries = []
+
+        if visible_keys is not None:
+            for column, key in enumerate(display_keys):
+                self.setColumnHidden(column, key not in visible_keys)
+
+        self.horizontalHeader().setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.horizontalHeader().customContextMenuRequested.connect(self.show_column_menu)
+
+        # Folder sizes being worked out, path: FolderSizeJob. Finished sizes are repainted together.
+        self._size_jobs = {}
+        self._size_timer = QtCore.QTimer(self)
+        self._size_timer.setSingleShot(True)
+        self._size_timer.setInterval(FOLDER_SIZE_REPAINT_DELAY)
+        self._size_timer.timeout.connect(lambda: self._model.column_changed(FILE_SIZE))
+
+        # Refreshing the listing after the directory changed on disk.
+        self._refresh_lister = None
+        self._refresh_entries = []
+        self._refresh_pending = False
 
     def set_root_directory(self, item: FileItem):
+        """
+        Clear the view and list the directory on a worker thread, rows are added as batches arrive.
+        A listing that is still running for the previous directory is cancelled.
+        Directories that are in the listing cache and have not changed are shown right away.
+        """
         log.debug("Table Widget Setting Root {}".format(item))
 
+        self.cancel_listing()
+        self.cancel_refresh()
+        self.cancel_folder_sizes()
         self.clear()
         if isinstance(item, FileItem):
             self._item = item
         else:
             self._item = FileItem({FULL_PATH: item})
-        items = os.listdir(self._item.file_path())
 
-        for row, path in enumerate(items):
-            full_path = os.path.join(self._item.file_path(), path)
-            full_path = full_path.replace('\\', '/')
-            file_item = FileItem({FULL_PATH: full_path})
-            self.add_item(file_item)
-        # self.sortItems()
+        self._listing_id += 1
+        self._listing_entries = []
+
+        with_stat = self.needs_stat()
+        cached = listing_cache().get(self._item.file_path(), with_stat)
+        if cached is not None:
+            with span("FileItem batch", "listing", items=len(cached)):
+                items = [FileItem({FULL_PATH: e.path}, e.is_dir, e.stat) for e in cached]
+            self.add_items(items)
+            self.request_folder_sizes(items)
+            self.directory_loaded.emit(self._item)
+            if with_stat:
+                # Editing a file does not change the folder mtime, re-read the stats behind the cached rows.
+                self.refresh_directory()
+            return
+
+        self._lister = DirectoryLister(self._item.file_path(), self._listing_id, with_stat)
+        self._lister.signals.batch.connect(self.add_listing_batch)
+        self._lister.signals.finished.connect(self.listing_finished)
+        self._lister.start()
+
+    def cancel_listing(self):
+        if self._lister:
+            self._lister.cancel()
+            self._lister = None
+
+    def is_listing(self):
+        return self._lister is not None
+
+    def needs_stat(self):
+        """
+        True when a visible column shows stat values, only then are listings made with stats.
+        """
+        return any(key in STAT_DISPLAY_KEYS and not self.isColumnHidden(column)
+                   for column, key in enumerate(self._display_keys))
+
+    def show_column_menu(self, pos):
+        menu = QtWidgets.QMenu(self)
+        # The name column always stays.
+        for column, key in enumerate(self._display_keys[1:], 1):
+            action = menu.addAction(key)
+            action.setCheckable(True)
+            action.setChecked(not self.isColumnHidden(column))
+            action.toggled.connect(partial(self.set_column_visible, column))
+        menu.exec_(self.horizontalHeader().mapToGlobal(pos))
+
+    def set_column_visible(self, column: int, visible: bool):
+        """
+        Rows listed without stats stat themselves once drawn in a stat column, the next listing brings them.
+        """
+        self.setColumnHidden(column, not visible)
+        if visible and self._display_keys[column] == FILE_SIZE:
+            self.request_folder_sizes(self._model.items())
+
+    def request_folder_sizes(self, items: list):
+        """
+        Work out the sizes of the folders among items in the background, only while the size column is shown.
+        Sizes known from earlier show right away and are updated if they changed.
+        """
+        if FILE_SIZE not in self._display_keys or self.isColumnHidden(self._display_keys.index(FILE_SIZE)):
+            return
+
+        folder_size_cache()  # Loaded here, not on a worker thread.
+        for item in items:
+            if not item.is_dir() or item.file_path() in self._size_jobs:
+                continue
+            job = FolderSizeJob(item.file_path())
+            job.signals.finished.connect(self.folder_size_ready)
+            self._size_jobs[item.file_path()] = job
+            job.start()
+
+    def cancel_folder_sizes(self):
+        for job in self._size_jobs.values():
+            job.cancel()
+        self._size_jobs = {}
+
+    def folder_size_ready(self, path: str, total):
+        self._size_jobs.pop(path, None)
+        if total is not None and not self._size_timer.isActive():
+            self._size_timer.start()
+
+    def add_listing_batch(self, listing_id: int, entries: list):
+        if listing_id != self._listing_id:
+            return
+        self._listing_entries.extend(entries)
+        with span("FileItem batch", "listing", items=len(entries)):
+            items = [FileItem({FULL_PATH: e.path}, e.is_dir, e.stat) for e in entries]
+        self.add_items(items)
+        self.request_folder_sizes(items)
+
+    def listing_finished(self, listing_id: int, completed: bool):
+        if listing_id != self._listing_id:
+            return
+        if completed:
+            listing_cache().store(self._lister.path(), self._lister.mtime(), self._listing_entries,
+                                  self._lister.with_stat())
+        self._lister = None
+        self._listing_entries = []
+        if completed:
+            self.directory_loaded.emit(self._item)
+
+        if self._refresh_pending:
+            self.refresh_directory()
+
+    def refresh_directory(self):
+        """
+        Re-list the root directory in the background and apply only the difference to the model,
+        new paths become row inserts and paths that are gone become row removes. A rename is both.
+        Rows whose stat values changed are updated in place.
+        """
+        if not self._item:
+            return
+
+        # Changes arriving while we are listing are picked up once that listing is done.
+        if self._lister or self._refresh_lister:
+            self._refresh_pending = True
+            return
+
+        self._refresh_pending = False
+        self._refresh_entries = []
+        self._refresh_lister = DirectoryLister(self._item.file_path(), self._listing_id, self.needs_stat())
+        self._refresh_lister.signals.batch.connect(self.add_refresh_batch)
+        self._refresh_lister.signals.finished.connect(self.refresh_finished)
+        self._refresh_lister.start()
+
+    def cancel_refresh(self):
+        self._refresh_pending = False
+        if self._refresh_lister:
+            self._refresh_lister.cancel()
+            self._refresh_lister = None
+
+    def add_refresh_batch(self, listing_id: int, entries: list):
+        if listing_id != self._listing_id:
+            return
+        self._refresh_entries.extend(entries)
+
+    def refresh_finished(self, listing_id: int, completed: bool):
+        if listing_id != self._listing_id:
+            return
+
+        if completed:
+            entries = self._refresh_entries
+            with_stat = self._refresh_lister.with_stat()
+            listing_cache().store(self._refresh_lister.path(), self._refresh_lister.mtime(), entries, with_stat)
+
+            current = {e.path: e for e in entries}
+            existing = self._model.paths()
+            removed = [row for row, path in enumerate(existing) if path not in current]
+
+            changed = []
+            if with_stat:
+                for row, item in enumerate(self._model.items()):
+                    entry = current.get(item.file_path())
+                    if entry is not None and entry.stat != item._stat:
+                        item.set_file_stat(entry.stat)
+                        changed.append(row)
+
+            existing = set(existing)
+            added = [FileItem({FULL_PATH: e.path}, e.is_dir, e.stat) for e in entries if e.path not in existing]
+
+            log.debug("Refreshing {}: {} added, {} removed, {} changed".format(
+                self._item.file_path(), len(added), len(removed), len(changed)))
+            self._model.refresh_rows(changed)
+            self._model.remove_rows(removed)
+            self.add_items(added)
+            self.request_folder_sizes(added)
+
+        self._refresh_lister = None
+        self._refresh_entries = []
+
+        if self._refresh_pending:
+            self.refresh_directory()
 
-        self.setHorizontalHeaderLabels(self._display_keys)
 
 class FavWidget(FileTableWidget):
     def __init__(self, items, name):
         super(FavWidget, self).__init__([FILE_NAME])
-        self.setRowCount(0)
         self.horizontalHeader().hide()
 
         if items:
-            for i in items:
-                self.add_item(FileItem(i))
+            self.add_items([i if isinstance(i, FileItem) else FileItem(i) for i in items])
 
         self.setObjectName(name)
 
+        # Sort keys are cached until their item changes.
+        self._sorter = PinSorter()
+        self._sort_type = None
+        self._stat_job = None
+        self._stat_job_id = 0
+        self._model.dataChanged.connect(self.pins_changed)
+        self._model.rowsAboutToBeRemoved.connect(lambda parent, first, last: self.forget_sort_keys(first, last))
+        self._model.modelReset.connect(lambda: self._sorter.invalidate())
+
+    def add_item(self, item: FileItem):
+        if item.date_added() is None:
+            item.set_date_added(time.time())
+        super().add_item(item)
+
+    def pins_changed(self, top_left, bottom_right, roles=()):
+        if roles and all(r == QtCore.Qt.DecorationRole for r in roles):
+            return  # Icons finished loading.
+        self.forget_sort_keys(top_left.row(), bottom_right.row())
+
+    def forget_sort_keys(self, first: int, last: int):
+        for row in range(first, last + 1):
+            item = self._model.item(row)
+            if item:
+                self._sorter.invalidate(item)
+
     def setup_context_menu(self):
         super().setup_context_menu()
         rename_pin = self._context_menu.addAction("Rename Pin")
@@ -774,62 +1314,113 @@ class FavWidget(FileTableWidget):
         set_pin_color.triggered.connect(self.set_pin_color)
 
         self._sort_context_menu = self._context_menu.addMenu("Sort by...")
-
-        sort = self._sort_context_menu.addAction("File Type")
-        sort.triggered.connect(partial(self.set_sort, sort.text()))
-
-        sort = self._sort_context_menu.addAction("Usage")
-        sort.triggered.connect(partial(self.set_sort, sort.text()))
-
-        sort = self._sort_context_menu.addAction("Name")
-        sort.triggered.connect(partial(self.set_sort, sort.text()))
-
-        sort = self._sort_context_menu.addAction("Size")
-        sort.triggered.connect(partial(self.set_sort, sort.text()))
-
-        sort = self._sort_context_menu.addAction("Date Added")
-        sort.triggered.connect(partial(self.set_sort, sort.text()))
+        for sort_type in SORT_TYPES:
+            sort = self._sort_context_menu.addAction(sort_type)
+            sort.triggered.connect(partial(self.set_sort, sort_type))
     #
     def set_pin_color(self):
         color = QtWidgets.QColorDialog.getColor()
-        if color.isValid():
-            print("color is valid!")
+        if not color.isValid():
+            return
 
-        for widget in self.selectedItems():
-            widget.setBackgroundColor(color)
-            widget.item.set_color(color)
+        for row in self.selected_rows():
+            self._model.item(row).set_color(color)
+            self._model.refresh_row(row)
 
     def set_sort(self, sort_type):
-        for i in range(self.count()):
-            w = self.item(i)
+        """
+        Pins that need a stat for the sort are stat'ed on the thread pool first, the sort runs when they are in.
+        :param sort_type: one of SORT_TYPES
+        """
+        self._sort_type = sort_type
+        if self._stat_job:
+            self._stat_job.signals.finished.disconnect(self.stats_ready)
+            self._stat_job = None
+
+        items = self._model.items()
+        unstated = self._sorter.needs_stat(items, sort_type)
+        if unstated:
+            self._stat_job_id += 1
+            self._stat_job = StatJob(self._stat_job_id, [i.file_path() for i in unstated])
+            self._stat_job.signals.finished.connect(self.stats_ready)
+            self._stat_job.start()
+            return
 
+        order = self._sorter.order(items, sort_type)
+        if order != list(range(len(order))):
+            self._model.reorder(order)
 
-            if sort_type == "Name":
-                w.sort_token = w.text()
-            if sort_type == "File Type":
-                w.sort_token = w.suffix + w.text()
-            if sort_type == "Usage":
-                w.sort_token = w.clicked_times
+    def stats_ready(self, job_id: int, stats: dict):
+        if not self._stat_job or job_id != self._stat_job.job_id():
+            return  # Sort changed since.
+        self._stat_job = None
 
-        self.sortItems()
+        for item in self._model.items():
+            if not item.has_file_stat() and item.file_path() in stats:
+                item.set_file_stat(stats[item.file_path()])
+        self.set_sort(self._sort_type)
 
     def delete_pins(self):
-        items = []
+        self._model.remove_rows(self.selected_rows())
+        print("Deleted Pins, left {}".format(self.get_items()))
 
-        while self.selectedItems():
-            widget = self.selectedItems()[0]
-            item = widget.item
-            if item in self._items:
-                self._items.remove(item)
+    def rename_pin(self):
+        index = self.currentIndex()
+        if not index.isValid():
+            return
+        flags = self._model.row_flags(index.row())
+        self._model.set_row_flags(index.row(), flags | QtCore.Qt.ItemIsEditable)
+        self.edit(index)
 
-            self.removeRow(self.row(widget))
 
+class PinList:
+    """
+    A saved pin list. Only the selected lists are shown, so the FavWidget is made the first time a list is
+    selected. Until then the list is its saved pin data, FileItems are only made when something asks for
+    the items, IE: a search. Neither touches the disk, pins are stat'ed when their rows are drawn.
+    """
 
-        print("Deleted Pins, left {}".format(self.get_items()))
+    def __init__(self, pins: list, name: str):
+        """
+        :param pins: saved pin data, [{FULL_PATH: path, ...}]
+        """
+        self._pins = pins or []
+        self._name = name
+        self._items = None
+        self._widget = None
 
-    def rename_pin(self):
-        flags = self.currentItem().flags()
-        self.currentItem().setFlags(flags | QtCore.Qt.ItemIsEditable)
-        self.edit(self.currentIndex())
+    def name(self):
+        return self._name
+
+    def set_name(self, name: str):
+        self._name = name
+        if self._widget:
+            self._widget.setObjectName(name)
+
+    def pin_count(self):
+        if self._widget:
+            return len(self._widget.get_items())
+        return len(self._pins)
+
+    def get_items(self):
+        if self._widget:
+            return self._widget.get_items()
+        if self._items is None:
+            self._items = [FileItem(p) for p in self._pins]
+        return self._items
 
+    def widget(self):
+        """
+        :return: FavWidget, or None if the list was never selected.
+        """
+        return self._widget
 
+    def materialize(self):
+        """
+        :return: FavWidget showing the list, made on first call.
+        """
+        if self._widget is None:
+            self._widget = FavWidget(self.get_items(), self._name)
+            self._pins = None
+            self._items = None
+        return self._widget
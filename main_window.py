@@ -1,21 +1,32 @@
 """
 @Author Neil Berard
 Entry point for File-Browser. Create a MainWindow and show it.
+
+Startup shows the window and the first browser first, the search thread, search options, search results
+browser and file index are set up once the first frame is painted. Modules only the search needs are
+imported then too.
 """
+import time
+IMPORT_START_TIME = time.perf_counter()
+
 import functools
-import json
 import logging
 import os
 import sys
-import time
 import traceback
 
 
 from PySide2 import QtWidgets, QtCore, QtGui
 from PySide2.QtCore import Signal
 
-from libs import utils
-from libs.widgets import TabWindow, DockWindow, BrowserWidget, FavWidget, FileItem, SearchOptionsWidget
+from libs.results import ResultSink
+from libs.scopes import CandidateSet
+from libs.folder_sizes import close_folder_size_cache
+from libs.frecency import access_store
+from libs.persistence import DataStore, LIST_ID, FAV_WIDGET_NAME, FAV_WIDGET_PINS
+from libs.startup import startup_profiler, PROFILE_STARTUP_FLAG
+from libs import tracing
+from libs.widgets import TabWindow, DockWindow, BrowserWidget, FavWidget, FileItem, SearchOptionsWidget, PinList
 from libs.consts import *
 
 logging.basicConfig()
@@ -30,17 +41,14 @@ ACTIVE_STYLE = "QWidget { background-color: rgba(255, 255, 255, 128); selection-
 INACTIVE_STYLE = "QWidget { background-color: rgba(128, 128, 128, 50);selection-background-color: rgba(255, 255, 255, 50)}"
 
 
-# Save Data keys
+# Save Data keys, the pin list and browser keys are in libs.persistence
 FULL_PATH = "_full_path"
-BROWSERS = "browsers"
-PIN_LISTS = "pin_lists"
 PIN_LIST_DATA = "pin_list_data"
 NAME = "name"
-FAV_WIDGET_NAME = "fav_widget_name"
-FAV_WIDGET_PINS = 'fav_widget_pins'
 
 SEARCH_TAB_TITLE = "Search Results"
-MAX_RESULTS = 200
+MAX_RESULTS = 20000
+INDEX_REFRESH_INTERVAL = 60  # Seconds between file index refreshes triggered by searching.
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -93,12 +101,21 @@ class MainWindow(QtWidgets.QMainWindow):
         self._settings.setFallbacksEnabled(False)
 
         self._data_path = os.path.join(DATA_DIR, "browser_data.json")
+        self._data_store = DataStore(self._data_path, self)
+        self._pin_lists = {}  # pin list id in the data store: PinList, the fav_combo item data is the id.
 
 
         self._browser_widgets_list = []
         self._active = None
         self._search_delay = 0.3
         self._search_text_entered_time = None
+        self._search_generation = None
+
+        # Searches are only dispatched once typing pauses for self._search_delay.
+        self._search_timer = QtCore.QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(int(self._search_delay * 1000))
+        self._search_timer.timeout.connect(self.dispatch_search)
 
         self.setCentralWidget(QtWidgets.QWidget())
         self.centralWidget().setLayout(QtWidgets.QVBoxLayout())
@@ -171,6 +188,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.search_cancel_btn.setIcon(QtGui.QIcon(os.path.join(ICON_PATH, "x-circle.svg")))
         self.tool_bar.layout().addWidget(self.search_cancel_btn)
         self.search_cancel_btn.hide()
+        self.search_cancel_btn.clicked.connect(self.cancel_search.emit)
         self.cancel_search.connect(self.search_cancel_btn.hide)
         self.start_search.connect(self.search_cancel_btn.show)
 
@@ -182,11 +200,18 @@ class MainWindow(QtWidgets.QMainWindow):
         self.search_status_lbl.hide()
         self.tool_bar.layout().addStretch()
 
-        # Search Options
-        self._search_options = SearchOptionsWidget(self)
+        # Search Options, made on first use.
+        self._search_options = None
+
+        # Search Results Tab, made with the first search.
+        self.search_results_window = None
+        self._result_sink = ResultSink(parent=self)
+        self._result_sink.status_changed.connect(self.search_status_lbl.setText)
 
-        # Search Results Tab
-        self.search_results_window = BrowserWidget(self)
+        # Search candidates of each search mode, kept up to date as browsers and pin lists change.
+        self._search_scopes = {SEARCH_EVERYWHERE: CandidateSet(self),
+                               SEARCH_FAVORITE_LIST: CandidateSet(self),
+                               SEARCH_ACTIVE_BROWSER: CandidateSet(self)}
 
         # Hamburger btn
         self.hamburger_btn = QtWidgets.QPushButton()
@@ -196,11 +221,15 @@ class MainWindow(QtWidgets.QMainWindow):
         self.options_menu = QtWidgets.QMenu()
         self.hamburger_btn.setMenu(self.options_menu)
         search = self.options_menu.addAction("Search Options")
-        search.triggered.connect(self._search_options.show)
+        search.triggered.connect(lambda: self.search_options().show())
 
         open_settings = self.options_menu.addAction("Open Settings Folder")
         open_settings.triggered.connect(lambda: os.startfile(SETTINGS_DIR))
 
+        self.record_trace_action = self.options_menu.addAction("Record Trace")
+        self.record_trace_action.setCheckable(True)
+        self.record_trace_action.toggled.connect(self.set_tracing)
+
         self.lower_grp = QtWidgets.QGroupBox()
         self.c_layout.addWidget(self.lower_grp)
         self.lower_grp.setLayout(QtWidgets.QHBoxLayout())
@@ -244,9 +273,26 @@ class MainWindow(QtWidgets.QMainWindow):
         # Data
         self._filter = None
 
-        # Threading
-        test_dirs = ['C:/Users/neilb/Pictures/Hikes', 'C:/Users/neilb/Pictures/ref']
-        self._thread = utils.Thread(search_directory_list=test_dirs)
+        # Threading, the search thread starts after the first frame.
+        self._thread = None
+        self._startup_finished = False
+
+        # File Index
+        self._index_updater = None
+        self._index_roots = []
+        self._index_update_time = 0
+
+    def start_search_thread(self):
+        from libs import utils  # Pulls in all search backends, kept off the startup path.
+
+        self._thread = utils.Thread(max_results=MAX_RESULTS)
+        self._thread.signals.result.connect(self.search_results)
+        self._thread.signals.ranked.connect(self.search_ranked)
+        self._thread.signals.progress.connect(self.progress_function)
+        self._thread.signals.finished.connect(self.search_complete)
+        self.cancel_search.connect(self._thread.cancel)
+        self.cancel_search.connect(self.search_cancelled)
+        self.update_search.connect(self._thread.set_search_items)
         self._thread.start()
 
 
@@ -263,42 +309,181 @@ class MainWindow(QtWidgets.QMainWindow):
         self._context_menu.exec_(self.mapToGlobal(pos))
         pass
 
-    def progress_function(self, n):
-        self.search_status_lbl.setText(n)
+    def progress_function(self, generation: int, n: int):
+        if generation != self._search_generation:
+            return
+        self._result_sink.set_progress(n)
         # print("Running thread")
 
     def print_output(self, s):
         print(s)
 
-    def search_complete(self):
+    def search_results(self, results):
+        """
+        :param results: (generation, [FileItem]) from the search thread.
+        """
+        generation, items = results
+        if generation != self._search_generation:
+            return
+        self._result_sink.add(items)
+
+    def search_ranked(self, results):
+        """
+        :param results: (generation, [FileItem]) best first, replaces the previously ranked results.
+        """
+        generation, items = results
+        if generation != self._search_generation:
+            return
+        self._result_sink.replace(items)
+
+    def search_complete(self, generation: int):
+        if generation != self._search_generation:
+            return
         log.info("Search Completed")
+        self._result_sink.finish()
+
+    def search_cancelled(self):
+        self._search_timer.stop()
+        self._search_generation = None
+        self._result_sink.cancel()
+        self.search_status_lbl.hide()
+
+    def set_tracing(self, enabled: bool):
+        """
+        Start recording a trace, or stop and save it to the traces folder as Chrome trace JSON.
+        Open it in chrome://tracing or https://ui.perfetto.dev.
+        """
+        if enabled:
+            tracing.start()
+            return
+
+        tracing.stop()
+        path = os.path.join(DATA_DIR, "traces", "trace_{}.json".format(time.strftime("%Y%m%d_%H%M%S")))
+        try:
+            tracing.save(path)
+        except OSError as ex:
+            log.error("Could not save trace {}: {}".format(path, ex))
+            return
+        QtWidgets.QMessageBox.information(self, "Trace Saved", "Saved {} events to\n{}".format(
+            tracing.event_count(), path))
+
+    def search_options(self):
+        """
+        :return: SearchOptionsWidget, made on first use.
+        """
+        if self._search_options is None:
+            self._search_options = SearchOptionsWidget(self)
+        return self._search_options
+
+    def show_search_results(self):
+        """
+        Add the search results browser if it is not open, without making it the active browser.
+        """
+        if self.search_results_window is None:
+            self.search_results_window = BrowserWidget(self)
+            self.search_results_window.setWindowTitle(SEARCH_TAB_TITLE)
+            self.search_results_window._leaf = SEARCH_TAB_TITLE
+
+        browser = self.search_results_window
+        if browser in self._browser_widgets_list:
+            return
+
+        active = self.get_active_browser()
+        self.add_browser(set_path=False, browser_window=browser)
+        self.set_active_browser_title(SEARCH_TAB_TITLE)
+        if active:
+            self.set_active_browser(active)
 
     def run_search(self):
         """
+        Called on every edit of the search text, restarts the search delay.
+        """
+        self._search_text_entered_time = time.time()
+        if not self.search_ln_edit.text():
+            self.cancel_search.emit()
+            return
 
-        :return:
+        self._search_timer.start()
+
+    def dispatch_search(self):
+        """
+        Send the search text to the search thread once typing has paused.
         """
         if not self.search_ln_edit.text():
             return
 
+        log.debug("Dispatching search {:.0f}ms after the last edit".format(
+            (time.time() - self._search_text_entered_time) * 1000))
+
         if not self._thread:
-            # TEST DIRECTORIES TO FEED IT
-            test_dirs = ['C:/Users/neilb/Pictures/Hikes', 'C:/Users/neilb/Pictures/ref']
+            self.start_search_thread()
+
+        options = self.search_options()
+        self.update_file_index()
+        self._thread.set_cache_index(options.cache_index_option())
+        self._thread.set_search_recursive(options.recursive_option())
+        self._thread.set_fuzzy(options.fuzzy_option())
+        self._thread.set_search_file_contents(options.file_contents_option(), options.file_types())
+
+        scope = self.search_scope()
+        self._thread.set_search_items(scope.items(), scope.key())
 
-            self._thread = utils.Thread(search_directory_list=test_dirs)
-            self.cancel_search.connect(self._thread.exit)
-            self.update_search.connect(self._thread.set_search_items)
-            self._thread.start()
+        self.show_search_results()
+        self._result_sink.set_view(self.search_results_window.table_view)
+        self._result_sink.start()
+        self.search_status_lbl.show()
+        self._search_generation = self._thread.set_search_string(self.search_ln_edit.text())
+        self.start_search.emit(self.search_ln_edit.text())
 
-            # self._thread.finished.connect(self._thread.deleteLater)
 
-        items = self.get_file_items()
-        self._thread.set_search_items(items)
-        self._thread.set_search_string(self.search_ln_edit.text())
 
 
 
+    def index_roots(self):
+        """
+        Folders the file index covers, the open browsers and pinned folders.
+        """
+        roots = set()
+        for b in self._browser_widgets_list:
+            if b._item and b.windowTitle() != SEARCH_TAB_TITLE:
+                roots.add(b._item.file_path())
 
+        for pin_list in self._pin_lists.values():
+            for item in pin_list.get_items():
+                if item.is_dir():
+                    roots.add(item.file_path())
+        return sorted(roots)
+
+    def update_file_index(self, startup=False):
+        """
+        Refresh the file index in the background if the cache index search option is on.
+        Roots are only dropped from the index at startup, browsers come and go while we run.
+
+        :param startup: Bool, index exactly the current roots and skip the refresh interval.
+        """
+        # The options dialog is only built once the user opens it or searches.
+        if self._search_options is not None:
+            cache_index = self._search_options.cache_index_option()
+        else:
+            cache_index = SearchOptionsWidget.saved_cache_index_option()
+        if not cache_index:
+            return
+
+        roots = self.index_roots()
+        if not startup:
+            if set(roots) <= set(self._index_roots) and \
+                    time.time() - self._index_update_time < INDEX_REFRESH_INTERVAL:
+                return
+            roots = sorted(set(roots) | set(self._index_roots))
+
+        if self._index_updater:
+            self._index_updater.cancel()
+
+        self._index_roots = roots
+        self._index_update_time = time.time()
+        from libs.index import IndexUpdater
+        self._index_updater = IndexUpdater(roots)
+        self._index_updater.start()
 
     def kill_active_threads(self):
         self._can_search = False
@@ -362,41 +547,23 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def set_fav_list_name(self, idx, name):
         self.fav_combo.setItemText(idx, name)
-        fav_widget = self.fav_combo.itemData(idx)
-        fav_widget.setObjectName(name)
+        list_id = self.fav_combo.itemData(idx)
+        self._pin_lists[list_id].set_name(name)
+        self._data_store.rename_list(list_id, name)
 
 
     def save_fav_lists(self):
-        save_data = {}
+        """
+        Pin changes are journaled as they happen, only the browsers are left to record before writing
+        out what is pending.
+        """
         browser_data = {}
         for num, b in enumerate(self._browser_widgets_list):
             browser_data["browser_" + str(num)] = serialize(b)
-            print(browser_data)
-
-        pin_list_data = []
-
-        for num in range(self.fav_combo.count()):
-            fav_list = self.fav_combo.itemData(num)
-            assert isinstance(fav_list, FavWidget)
 
-            pin_list_items = []
-            for i in fav_list.get_items():
-
-                pin_list_items.append(serialize(i))
-
-            pin_list_data.append({FAV_WIDGET_NAME: self.fav_combo.itemText(num),
-                                  FAV_WIDGET_PINS: pin_list_items})
-
-        if not os.path.exists(os.path.dirname(self._data_path)):
-            os.makedirs(os.path.dirname(self._data_path))
-
-        save_data[PIN_LISTS] = pin_list_data
-        save_data[BROWSERS] = browser_data
         log.debug("Saving Pin List data {}".format(self._data_path))
-        log.debug(save_data)
-
-        with open(self._data_path, 'w') as f:
-            json.dump(save_data, f, indent=4, sort_keys=True)
+        self._data_store.set_browsers(browser_data)
+        self._data_store.flush()
 
     def set_browser_context(self, context=DOCK_WIDGET_VIEW_MODE):
         log.debug("Setting view context {}".format(context))
@@ -433,25 +600,27 @@ class MainWindow(QtWidgets.QMainWindow):
             self.set_browser_context(TAB_VIEW_MODE)
 
     def load_saved_data(self):
-
-        if os.path.exists(self._data_path):
-            with open(self._data_path, 'r') as f:
-                self._save_data = json.load(f)
-
-        if not self._save_data:
+        if self._data_store.is_loaded():
             return
 
         # Load browsers
-        # for k, v in self._save_data[BROWSERS].items():
+        # for k, v in self._data_store.browsers().items():
         #     self.add_browser(v)
 
-        for i in self._save_data[PIN_LISTS]:
-            print("loading fav list {}".format(i))
-            self.add_fav_list(items=i[FAV_WIDGET_PINS], name=i[FAV_WIDGET_NAME])
+        # Lists are records until selected, only the last one gets a widget now.
+        self.fav_combo.blockSignals(True)
+        for i in self._data_store.load():
+            log.debug("loading fav list {}".format(i[FAV_WIDGET_NAME]))
+            self.add_fav_list(items=i[FAV_WIDGET_PINS], name=i[FAV_WIDGET_NAME], list_id=i[LIST_ID],
+                              set_current=False)
+        self.fav_combo.blockSignals(False)
 
         # Make sure we have at least one pin list
         if not self.fav_combo.count():
             self.add_fav_list()
+        else:
+            self.fav_combo.setCurrentIndex(self.fav_combo.count() - 1)
+            self.set_active_pin_tray(self.fav_combo.currentData())
 
 
 
@@ -460,46 +629,82 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def remove_fav_list(self):
         idx = self.fav_combo.currentIndex()
-        widget = self.fav_combo.itemData(idx)
+        list_id = self.fav_combo.itemData(idx)
+        pin_list = self._pin_lists.pop(list_id)
         self.fav_combo.removeItem(idx)
-        widget.deleteLater()
+        self._search_scopes[SEARCH_EVERYWHERE].remove_source(pin_list)
+        self._data_store.remove_list(list_id)
+        if pin_list.widget():
+            pin_list.widget().deleteLater()
 
-    def add_fav_list(self, items=None, widget_data=None, name=""):
+    def add_fav_list(self, items=None, widget_data=None, name="", list_id=None, set_current=True):
         """
-        :param items: list
+        :param items: list of saved pin data
         :param widget_data: Serialized class data
         :param name: str
+        :param list_id: id of a pin list loaded from the data store, new lists are added to it.
+        :param set_current: Bool, select the new list, which makes its FavWidget.
         :return:
         """
-
-        # fav_widget = createView(QtWidgets.QListWidget, FavWidget, self, items, name)
-        fav_widget = FavWidget(items, name)
-        fav_widget.path_changed.connect(self.set_active_browser_path)
-        fav_widget.new_tab.connect(self.add_browser_from_item)
-
         if not name:
             if widget_data and NAME in widget_data.keys():
                 name = widget_data[NAME]
             else:
                 name = "Pin List {}".format(self.fav_combo.count())
 
-        self.fav_combo.addItem(name, fav_widget)
+        if list_id is None:
+            list_id = self._data_store.add_list(name, items)
+
+        pin_list = PinList(items, name)
+        self._pin_lists[list_id] = pin_list
+        self._search_scopes[SEARCH_EVERYWHERE].add_source(pin_list, [])
+
+        self.fav_combo.addItem(name, list_id)
+        if set_current:
+            self.fav_combo.setCurrentIndex(self.fav_combo.count() - 1)
+
+    def fav_widget(self, list_id):
+        """
+        :return: FavWidget of the pin list, made the first time the list is needed.
+        """
+        pin_list = self._pin_lists[list_id]
+        if pin_list.widget():
+            return pin_list.widget()
+
+        # fav_widget = createView(QtWidgets.QListWidget, FavWidget, self, items, name)
+        fav_widget = pin_list.materialize()
+        fav_widget.path_changed.connect(self.set_active_browser_path)
+        fav_widget.new_tab.connect(self.add_browser_from_item)
+        fav_widget.hide()
         self.fav_grp.layout().addWidget(fav_widget)
-        self.fav_combo.setCurrentIndex(self.fav_combo.count() - 1)
+
+        # The items come from the widget from now on and can change.
+        self._search_scopes[SEARCH_EVERYWHERE].remove_source(pin_list)
+        self._search_scopes[SEARCH_EVERYWHERE].add_source(pin_list, [fav_widget.model()])
+        self._data_store.track_list(list_id, fav_widget.model())
+        return fav_widget
 
     def add_fav_pin(self, item):
-        fav_widget = self.fav_combo.currentData()
+        fav_widget = self.fav_widget(self.fav_combo.currentData())
         assert isinstance(fav_widget, FavWidget)
         fav_widget.add_item(item)
+        self.update_file_index()
 
 
-    def set_active_pin_tray(self, tray):
-        for idx in range(self.fav_combo.count()):
-            i = self.fav_combo.itemData(idx)
-            if i == tray:
-                i.show()
-            else:
-                i.hide()
+    def set_active_pin_tray(self, list_id):
+        if list_id is None:
+            self._search_scopes[SEARCH_FAVORITE_LIST].clear()
+            return
+
+        tray = self.fav_widget(list_id)
+        self._search_scopes[SEARCH_FAVORITE_LIST].set_sources([(self._pin_lists[list_id], [tray.model()])])
+
+        for pin_list in self._pin_lists.values():
+            widget = pin_list.widget()
+            if widget is tray:
+                widget.show()
+            elif widget:
+                widget.hide()
 
 
     def set_active_browser_title(self, title):
@@ -521,12 +726,16 @@ class MainWindow(QtWidgets.QMainWindow):
 
         browser_window.table_view.new_tab.connect(self.add_browser_from_item)
         browser_window.table_view.new_pin.connect(self.add_fav_pin)
+        browser_window.list_view.new_tab.connect(self.add_browser_from_item)
+        browser_window.list_view.new_pin.connect(self.add_fav_pin)
 
         # PATH EDIT
         browser_window.path_line_edit.new_tab.connect(self.add_browser_from_item)
         browser_window.path_line_edit.new_pin.connect(self.add_fav_pin)
 
         self._browser_widgets_list.append(browser_window)
+        if browser_window is not self.search_results_window:
+            self._search_scopes[SEARCH_EVERYWHERE].add_source(browser_window, browser_window.models())
         self._browser_context.add_widget(browser_window)
         self.set_active_browser(browser_window)
 
@@ -553,6 +762,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if browser_widget in self._browser_widgets_list:
             self._browser_widgets_list.remove(browser_widget)
             self._browser_context.remove_widget(browser_widget)
+            self._search_scopes[SEARCH_EVERYWHERE].remove_source(browser_widget)
 
         if self._active == browser_widget:
             if self._browser_widgets_list:
@@ -574,14 +784,19 @@ class MainWindow(QtWidgets.QMainWindow):
 
         log.debug("Main Window setting active browser {}".format(browser.windowTitle()))
 
-        for w in self._browser_widgets_list:
-            assert isinstance(w, BrowserWidget)
-            w.list_view.setStyleSheet(INACTIVE_STYLE)
-            w.table_view.setStyleSheet(INACTIVE_STYLE)
+        with tracing.span("set_active_browser.stylesheets", browsers=len(self._browser_widgets_list)):
+            for w in self._browser_widgets_list:
+                assert isinstance(w, BrowserWidget)
+                w.list_view.setStyleSheet(INACTIVE_STYLE)
+                w.table_view.setStyleSheet(INACTIVE_STYLE)
         self._active = browser
+        # Searching the search results would search what the search is about to clear.
+        if browser is not self.search_results_window:
+            self._search_scopes[SEARCH_ACTIVE_BROWSER].set_sources([(browser, browser.models())])
         if browser:
-            browser.list_view.setStyleSheet(ACTIVE_STYLE)
-            browser.table_view.setStyleSheet(ACTIVE_STYLE)
+            with tracing.span("set_active_browser.stylesheets", browsers=1):
+                browser.list_view.setStyleSheet(ACTIVE_STYLE)
+                browser.table_view.setStyleSheet(ACTIVE_STYLE)
 
     def set_active_browser_path(self, file_item: FileItem):
         log.debug("Setting Active Browser Path {}".format(file_item._full_path))
@@ -602,40 +817,68 @@ class MainWindow(QtWidgets.QMainWindow):
         line_edit.setPalette(p)
 
 
+    def search_scope(self):
+        """
+        :return: CandidateSet of the search mode picked in the search options.
+        """
+        return self._search_scopes.get(self.search_options().search_mode(),
+                                       self._search_scopes[SEARCH_EVERYWHERE])
+
     def get_file_items(self):
-        all_items = []
-        for b in self._browser_widgets_list:
-            assert isinstance(b, BrowserWidget)
-            if b.windowTitle() == SEARCH_TAB_TITLE:
-                continue
-            for i in b._view_context.get_items():
-                all_items.append(i)
-        # fav widgets
-        for i in range(self.fav_combo.count()):
-            widget = self.fav_combo.itemData(i)
-            assert isinstance(widget, FavWidget)
-            all_items.extend(widget.get_items())
-
-        return all_items
+        return self.search_scope().items()
 
     def closeEvent(self, *args):
 
         try:
-            self._thread.exit()
+            if self._thread:
+                self._thread.exit()
+                self._thread.wait()
         except Exception as ex:
             log.error(ex)
 
+        # A profiling run only measures startup, nothing it did is saved.
+        if startup_profiler().is_enabled():
+            return
+
         if CAN_SAVE_SETTINGS:
             self._settings.setValue('size', self.size())
             self._settings.setValue('pos', self.pos())
             self.save_fav_lists()
         else:
             log.warning("Cannot save fav list!")
+        self._data_store.close()
+        access_store().close()
+        close_folder_size_cache()
 
     def showEvent(self, *args):
         self.resize(self._settings.value('size', QtCore.QSize(500, 500)))
 
         self.load_saved_data()
+        if not self._startup_finished:
+            startup_profiler().mark("show and pin lists")
+            # Runs once the event loop has painted the window.
+            QtCore.QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """
+        Everything the first frame does not need.
+        """
+        if self._startup_finished:
+            return
+        self._startup_finished = True
+        profiler = startup_profiler()
+        profiler.mark("first paint")
+
+        if not self._thread:
+            self.start_search_thread()
+        profiler.mark("search thread")
+
+        self.update_file_index(startup=True)
+        profiler.mark("file index")
+
+        if profiler.is_enabled():
+            print(profiler.report())
+            self.close()
 
 def serialize_rercursive(obj, serialized):
     if not isinstance(obj, dict):
@@ -682,20 +925,30 @@ def set_theme(app, stylesheet_path):
 
 
 if __name__ == '__main__':
+    # Content search runs on worker processes, needed for frozen builds on Windows.
+    import multiprocessing
+    multiprocessing.freeze_support()
 
+    profiler = startup_profiler()
+    if PROFILE_STARTUP_FLAG in sys.argv:
+        sys.argv.remove(PROFILE_STARTUP_FLAG)
+        profiler.enable(IMPORT_START_TIME)
+    profiler.mark("imports")
 
     app = QtWidgets.QApplication(sys.argv)
+    profiler.mark("QApplication")
 
     window = MainWindow()
     window.resize(800, 500)
+    profiler.mark("MainWindow")
 
 
     window.setWindowTitle('File Browser')
     window.set_browser_context(DOCK_WIDGET_VIEW_MODE)
-    window.show()
-
-    window.set_browser_context(context=DOCK_WIDGET_VIEW_MODE)
     window.add_browser({FULL_PATH: TEST_PATH})
+    profiler.mark("first browser")
+
+    window.show()
     if not window.fav_combo.count():
         window.add_fav_list({}, name="Fav Stuffs")
 
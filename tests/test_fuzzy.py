@@ -0,0 +1,26 @@
+from libs.fuzzy import fold_case, fuzzy_score, TopK
+
+
+def test_fold_case_keeps_length():
+    text = "C:/İstanbul/İ/ax"
+    assert len(fold_case(text)) == len(text)
+    assert fold_case("Some/Path") == "some/path"
+
+
+def test_score_path_that_changes_length_when_lowercased():
+    assert fuzzy_score("ix", "C:/İstanbul/İ/ax") is not None
+    assert fuzzy_score(fold_case("İst"), "C:/İstanbul/a.txt") is not None
+    assert fuzzy_score("zz", "C:/İstanbul/İ/ax") is None
+
+
+def test_name_match_beats_folder_match():
+    in_name = fuzzy_score("main", "C:/projects/tools/main_window.py")
+    in_folder = fuzzy_score("main", "C:/maintenance/tools/window.py")
+    assert in_name > in_folder
+
+
+def test_top_k_keeps_best():
+    top = TopK(2)
+    for score in (5, 1, 9, 3):
+        top.push(score, score)
+    assert [value for _, value in top.ranked()] == [9, 5]
@@ -0,0 +1,131 @@
+import glob
+import json
+
+import pytest
+
+pytest.importorskip("PySide2")
+
+from libs.persistence import (DataStore, apply_op, empty_state, upgrade_snapshot, DATA_FORMAT,
+                              DATA_FORMAT_VERSION, FORMAT, FORMAT_VERSION, SEQUENCE, OP, ADD_LIST, ADD_PINS,
+                              REMOVE_PINS, RENAME_LIST, SET_BROWSERS, BROWSERS, PIN_LISTS, LIST_ID,
+                              FAV_WIDGET_NAME, FAV_WIDGET_PINS)
+
+
+def pin(path):
+    return {"_full_path": path}
+
+
+def write_snapshot(path, seq, pin_lists):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({FORMAT: DATA_FORMAT, FORMAT_VERSION: DATA_FORMAT_VERSION, SEQUENCE: seq,
+                   BROWSERS: {}, PIN_LISTS: pin_lists}, f)
+
+
+def write_journal(path, ops, tail=""):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({FORMAT: DATA_FORMAT, FORMAT_VERSION: DATA_FORMAT_VERSION}) + "\n")
+        for seq, op in enumerate(ops, 1):
+            f.write(json.dumps(dict(op, **{SEQUENCE: seq})) + "\n")
+        f.write(tail)
+
+
+def pin_paths(pin_lists):
+    return {l[FAV_WIDGET_NAME]: [p["_full_path"] for p in l[FAV_WIDGET_PINS]] for l in pin_lists}
+
+
+def test_apply_op():
+    state = empty_state()
+    apply_op(state, {OP: ADD_LIST, LIST_ID: 0, FAV_WIDGET_NAME: "Work"})
+    apply_op(state, {OP: ADD_PINS, LIST_ID: 0, "row": 0, FAV_WIDGET_PINS: [pin("a"), pin("b"), pin("c")]})
+    apply_op(state, {OP: REMOVE_PINS, LIST_ID: 0, "first": 1, "last": 1})
+    apply_op(state, {OP: RENAME_LIST, LIST_ID: 0, FAV_WIDGET_NAME: "Home"})
+    apply_op(state, {OP: SET_BROWSERS, BROWSERS: {"0": "C:/"}})
+    # Ops of lists that are gone are skipped.
+    apply_op(state, {OP: ADD_PINS, LIST_ID: 7, "row": 0, FAV_WIDGET_PINS: [pin("x")]})
+
+    assert pin_paths(state[PIN_LISTS]) == {"Home": ["a", "c"]}
+    assert state[BROWSERS] == {"0": "C:/"}
+
+
+def test_upgrade_snapshot():
+    # The first version had no version key and no list ids.
+    state = upgrade_snapshot({BROWSERS: {"0": "C:/"},
+                              PIN_LISTS: [{FAV_WIDGET_NAME: "Work", FAV_WIDGET_PINS: [pin("a")]},
+                                          {FAV_WIDGET_NAME: "Home"}]})
+
+    assert [l[LIST_ID] for l in state[PIN_LISTS]] == [0, 1]
+    assert pin_paths(state[PIN_LISTS]) == {"Work": ["a"], "Home": []}
+    assert state[BROWSERS] == {"0": "C:/"}
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "browser_data.json")
+    store = DataStore(path)
+    assert store.load() == []
+    list_id = store.add_list("Work", [pin("a")])
+    store.add_pins(list_id, 1, [pin("b")])
+    store.set_browsers({"0": "C:/"})
+    store.close()
+
+    store = DataStore(path)
+    assert pin_paths(store.load()) == {"Work": ["a", "b"]}
+    assert store.browsers() == {"0": "C:/"}
+    assert store.add_list("Home") == list_id + 1
+    store.close()
+
+
+def test_journal_after_snapshot(tmp_path):
+    path = str(tmp_path / "browser_data.json")
+    write_snapshot(path, 2, [{LIST_ID: 0, FAV_WIDGET_NAME: "Work", FAV_WIDGET_PINS: [pin("a")]}])
+    # The first two ops are in the snapshot already.
+    write_journal(str(tmp_path / "browser_data.journal"), [
+        {OP: ADD_LIST, LIST_ID: 0, FAV_WIDGET_NAME: "Work"},
+        {OP: ADD_PINS, LIST_ID: 0, "row": 0, FAV_WIDGET_PINS: [pin("a")]},
+        {OP: ADD_PINS, LIST_ID: 0, "row": 1, FAV_WIDGET_PINS: [pin("b")]},
+    ])
+
+    store = DataStore(path)
+    assert pin_paths(store.load()) == {"Work": ["a", "b"]}
+    store.close()
+
+
+def test_torn_journal_line(tmp_path):
+    path = str(tmp_path / "browser_data.json")
+    write_journal(str(tmp_path / "browser_data.journal"), [
+        {OP: ADD_LIST, LIST_ID: 0, FAV_WIDGET_NAME: "Work"},
+        {OP: ADD_PINS, LIST_ID: 0, "row": 0, FAV_WIDGET_PINS: [pin("a")]},
+    ], tail='{"op": "add_pins", "id": 0, "row": 1, "fav_wid')
+
+    store = DataStore(path)
+    assert pin_paths(store.load()) == {"Work": ["a"]}
+    store.close()
+
+    store = DataStore(path)
+    assert pin_paths(store.load()) == {"Work": ["a"]}
+    store.close()
+
+
+def test_corrupt_snapshot(tmp_path):
+    path = str(tmp_path / "browser_data.json")
+    journal_path = str(tmp_path / "browser_data.journal")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"format": "file-browser-data", "pin_li')
+    write_journal(journal_path, [
+        {OP: ADD_LIST, LIST_ID: 1, FAV_WIDGET_NAME: "Home"},
+        {OP: ADD_PINS, LIST_ID: 0, "row": 0, FAV_WIDGET_PINS: [pin("a")]},
+    ])
+
+    store = DataStore(path)
+    assert pin_paths(store.load()) == {"Home": []}
+    store.add_list("New")
+    store.close()
+
+    # The unreadable snapshot and the journal are kept, nothing was compacted over them.
+    corrupt = glob.glob(path + ".corrupt-*")
+    assert len(corrupt) == 1
+    with open(corrupt[0], 'r', encoding='utf-8') as f:
+        assert f.read() == '{"format": "file-browser-data", "pin_li'
+    assert glob.glob(journal_path + ".corrupt-*")
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        ops = [json.loads(line) for line in f]
+    assert [op.get(OP) for op in ops] == [None, ADD_LIST, ADD_PINS, ADD_LIST]
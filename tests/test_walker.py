@@ -0,0 +1,63 @@
+import os
+
+from libs import walker
+from libs.walker import ParallelWalker
+
+scandir = os.scandir
+
+
+class ZeroInodeEntry:
+    """
+    DirEntry as listed on Windows, stat() has no device or inode number.
+    """
+
+    def __init__(self, entry):
+        self._entry = entry
+        self.path = entry.path
+        self.name = entry.name
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def stat(self, follow_symlinks=True):
+        st = list(self._entry.stat(follow_symlinks=follow_symlinks))
+        st[1] = 0  # st_ino
+        st[2] = 0  # st_dev
+        return os.stat_result(st)
+
+
+class ZeroInodeScandir:
+    def __init__(self, path):
+        self._it = scandir(path)
+
+    def __enter__(self):
+        return (ZeroInodeEntry(e) for e in self._it)
+
+    def __exit__(self, *args):
+        self._it.close()
+
+
+def make_tree(root):
+    for i in range(3):
+        for j in range(2):
+            folder = os.path.join(root, "a{}".format(i), "b{}".format(j))
+            os.makedirs(folder)
+            open(os.path.join(folder, "file.txt"), 'w').close()
+
+
+def test_walk_finds_every_folder(tmp_path):
+    make_tree(str(tmp_path))
+    paths = set(e.path for e in ParallelWalker([str(tmp_path)]).walk())
+    assert len(paths) == 3 + 6 + 6
+
+
+def test_walk_with_zero_inode_numbers(tmp_path, monkeypatch):
+    make_tree(str(tmp_path))
+    monkeypatch.setattr(walker.os, "scandir", ZeroInodeScandir)
+
+    entries = list(ParallelWalker([str(tmp_path)]).walk())
+    assert len([e for e in entries if e.is_dir]) == 3 + 6
+    assert len([e for e in entries if not e.is_dir]) == 6